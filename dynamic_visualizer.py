@@ -1,5 +1,4 @@
 import sys
-import re
 import pygame
 import time
 import numpy as np
@@ -10,11 +9,26 @@ import threading
 import queue
 import subprocess
 from typing import List, Tuple, Optional
+from sim_clock import SimulationClock, interpolate_pose
+import mapf_io
+import path_analytics
+import local_repair
+
+AGENT_COLORS = [
+    (31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40),
+    (148, 103, 189), (140, 86, 75), (227, 119, 194), (127, 127, 127),
+    (188, 189, 34), (23, 190, 207), (255, 152, 150), (197, 176, 213)
+]
+
+# Timesteps an attached visualizer may drift from its session before it snaps to the server's clock
+SESSION_DRIFT_STEPS = 1.0
 
 class DynamicMAPFVisualizer:
-    def __init__(self, map_file: str, initial_scen_file: Optional[str] = None, initial_agent_num: int = 0):
+    def __init__(self, map_file: str, initial_scen_file: Optional[str] = None, initial_agent_num: int = 0,
+                 session_client=None):
         self.map_file = map_file
         self.obstacles, self.nrows, self.ncols = self.parse_map(map_file)
+        self.grid = mapf_io.load_grid(map_file)
         
         # Agent data
         self.agents = []  # List of (start, goal, path, color, agent_id)
@@ -27,15 +41,25 @@ class DynamicMAPFVisualizer:
         self.running = True
         self.paused = False
         self.frame = 0
-        self.speed = 1
         self.makespan = 1
+        self.render_fps = 60
+        self.sim_clock = SimulationClock(steps_per_second=1.0)  # Simulation rate, independent of render_fps
         
         # UI state
         self.selecting = False
         self.select_stage = 0  # 0: not selecting, 1: select start, 2: select goal
+        self.select_action = 'add'  # 'add', 'remove' (click an agent) or 'goal' (click an agent, then its new goal)
+        self.selected_agent = None
         self.new_start = None
         self.new_goal = None
         
+        # Space-time reservations for local repairs, rebuilt lazily after every full replan
+        self.reservations = None
+        
+        # Congestion heatmap overlay (None or one of path_analytics.HEATMAP_METRICS)
+        self.heatmap_metric = None
+        self.analytics = None
+        
         # Threading for pathfinding
         self.pathfinding_queue = queue.Queue()
         self.pathfinding_thread = None
@@ -46,6 +70,11 @@ class DynamicMAPFVisualizer:
         self.loading_error = None
         self.loading_thread = None
         
+        # Read-only attachment to a planning server session (see planning_server.py)
+        self.session_client = session_client
+        self.session_state = None  # Latest state fetched by the polling thread
+        self.session_thread = None
+        
         # Initialize pygame
         pygame.init()
         self.setup_display()
@@ -59,26 +88,15 @@ class DynamicMAPFVisualizer:
                 self.loading_thread.start()
             else:
                 self.load_initial_agents(initial_scen_file, initial_agent_num)
+        
+        if self.session_client:
+            pygame.display.set_caption(f'Dynamic Multi-Agent Pathfinding Visualization (read-only: {self.session_client.session_url})')
+            self.session_thread = threading.Thread(target=self._poll_session_thread, daemon=True)
+            self.session_thread.start()
     
     def parse_map(self, map_filename):
         """Parse map file to get obstacles and dimensions"""
-        obstacles = set()
-        nrows = ncols = 0
-        with open(map_filename, 'r') as f:
-            lines = f.readlines()
-            for i, line in enumerate(lines):
-                if line.startswith('height'):
-                    nrows = int(line.strip().split()[1])
-                elif line.startswith('width'):
-                    ncols = int(line.strip().split()[1])
-                elif line.strip() == 'map':
-                    map_start = i + 1
-                    break
-            for r, line in enumerate(lines[map_start:map_start + nrows]):
-                for c, ch in enumerate(line.strip()):
-                    if ch == '@':
-                        obstacles.add((r, c))
-        return obstacles, nrows, ncols
+        return mapf_io.parse_map(map_filename)
     
     def setup_display(self):
         """Setup pygame display and UI elements"""
@@ -115,6 +133,11 @@ class DynamicMAPFVisualizer:
         """Draw static grid and obstacles to a background surface for fast blitting."""
         self.bg_surface = pygame.Surface((self.width, self.height))
         self.bg_surface.fill(self.bg_color)
+        # Draw congestion heatmap under obstacles and grid lines
+        if self.heatmap_metric and self.analytics:
+            rgb = path_analytics.heatmap_rgb(getattr(self.analytics, self.heatmap_metric), self.bg_color)
+            heat = pygame.surfarray.make_surface(rgb.transpose(1, 0, 2))
+            self.bg_surface.blit(pygame.transform.scale(heat, (self.grid_w, self.grid_h)), (self.margin, self.margin))
         # Draw obstacles
         for (r, c) in self.obstacles:
             pygame.draw.rect(self.bg_surface, (0, 0, 0),
@@ -130,42 +153,61 @@ class DynamicMAPFVisualizer:
                 (self.margin, self.margin + y * self.cell_size),
                 (self.margin + self.ncols * self.cell_size, self.margin + y * self.cell_size), 1)
 
+    def update_analytics(self):
+        """Recompute path analytics and redraw the heatmap if one is shown"""
+        self.analytics = path_analytics.analyze_paths([agent[2] for agent in self.agents], self.nrows, self.ncols)
+        if self.heatmap_metric:
+            self.create_background_surface()
+
+    def invalidate_analytics(self):
+        """Drop analytics of replaced paths; they are only recomputed now if the heatmap is shown"""
+        self.analytics = None
+        if self.heatmap_metric:
+            self.update_analytics()
+    
+    def cycle_heatmap(self):
+        """Switch the overlay: off -> visits -> waits -> rotations -> off"""
+        metrics = (None,) + path_analytics.HEATMAP_METRICS
+        self.heatmap_metric = metrics[(metrics.index(self.heatmap_metric) + 1) % len(metrics)]
+        if self.heatmap_metric and self.analytics is None:
+            self.update_analytics()
+        else:
+            self.create_background_surface()
+        print(f"Heatmap: {self.heatmap_metric or 'off'}")
+    
     def load_initial_agents(self, scen_file: str, agent_num: int):
         """Load initial agents from scenario file"""
         starts, goals = self.parse_scen_file(scen_file, agent_num)
-        for i, (start, goal) in enumerate(zip(starts, goals)):
-            self.add_agent(start, goal)
+        self.load_agents(starts, goals)
+    
+    def load_agents(self, starts: List[Tuple[int, int]], goals: List[Tuple[int, int]]):
+        """Add a batch of agents (e.g. from scenario_generator.py) with a single replan"""
+        occupied = self._occupied_cells()
+        added = sum(self._append_agent(start, goal, occupied) for start, goal in zip(starts, goals))
+        self._recolor_agents()
+        print(f"Loaded {added} of {len(starts)} agents")
+        if added:
+            self.replan_all_paths()
+    
+    def load_plan(self, starts: List[Tuple[int, int]], goals: List[Tuple[int, int]], paths):
+        """Show a precomputed plan (e.g. from sharded_planner.py) without calling the pathfinder"""
+        for start, goal, path in zip(starts, goals, paths):
+            # A solved plan may share start and goal cells that add_agent keeps apart
+            if self._append_agent(start, goal, {}):
+                start, goal, _, color, agent_id = self.agents[-1]
+                self.agents[-1] = (start, goal, list(path), color, agent_id)
+                self.agent_histories[-1] = list(path)
+        self._recolor_agents()
+        self._paths_changed()
+        print(f"Loaded a plan for {len(self.agents)} agents, makespan: {self.makespan}")
     
     def parse_scen_file(self, scen_file: str, agent_num: int) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
         """Parse scenario file to get start and goal positions"""
-        starts = []
-        goals = []
-        with open(scen_file, 'r') as f:
-            lines = f.readlines()
-            for idx, line in enumerate(lines[1:agent_num+1]):  # Skip version line
-                parts = line.strip().split('\t')
-                if len(parts) >= 8:
-                    start_col, start_row = int(parts[4]), int(parts[5])
-                    goal_col, goal_row = int(parts[6]), int(parts[7])
-                    # Validation: check if within map bounds
-                    if not (0 <= start_row < self.nrows and 0 <= start_col < self.ncols and 0 <= goal_row < self.nrows and 0 <= goal_col < self.ncols):
-                        print(f"Warning: Agent {idx} start or goal out of bounds and will be skipped. Start=({start_row},{start_col}), Goal=({goal_row},{goal_col}), Map=({self.nrows},{self.ncols})")
-                        continue
-                    starts.append((start_row, start_col))
-                    goals.append((goal_row, goal_col))
-        return starts, goals
+        return mapf_io.parse_scen_file(scen_file, agent_num, self.nrows, self.ncols)
     
     def get_agent_colors(self, n_agents):
         """Generate distinct colors for agents"""
-        base_colors = [
-            (31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40),
-            (148, 103, 189), (140, 86, 75), (227, 119, 194), (127, 127, 127),
-            (188, 189, 34), (23, 190, 207), (255, 152, 150), (197, 176, 213)
-        ]
-        colors = []
-        for i in range(n_agents):
-            colors.append(base_colors[i % len(base_colors)])
-        return colors
+        return [AGENT_COLORS[i % len(AGENT_COLORS)] for i in range(n_agents)]
     
     def grid_pos_from_mouse(self, pos):
         """Convert mouse position to grid coordinates"""
@@ -178,30 +220,11 @@ class DynamicMAPFVisualizer:
     
     def write_scen_file(self, scen_path: str, starts: List[Tuple[int, int]], goals: List[Tuple[int, int]]):
         """Write scenario file for pathfinding"""
-        with open(scen_path, 'w') as f:
-            f.write('version 1\n')
-            for i, (s, g) in enumerate(zip(starts, goals)):
-                f.write(f"{i}\t{self.map_file}\t{self.ncols}\t{self.nrows}\t{s[1]}\t{s[0]}\t{g[1]}\t{g[0]}\t0\n")
+        mapf_io.write_scen_file(scen_path, self.map_file, self.nrows, self.ncols, starts, goals)
     
     def parse_paths_file(self, filename: str):
         """Parse paths from output file, including orientation if present"""
-        paths = []
-        with open(filename, 'r') as f:
-            for line in f:
-                m = re.match(r'Agent (\d+):(.*)', line.strip())
-                if not m:
-                    continue
-                path_str = m.group(2)
-                # Try to match (row,col,orientation)
-                coords = re.findall(r'\((\d+),(\d+),(\d+)\)', path_str)
-                if coords:
-                    path = [(int(r), int(c), int(o)) for r, c, o in coords]
-                else:
-                    # Fallback: match (row,col)
-                    coords = re.findall(r'\((\d+),(\d+)\)', path_str)
-                    path = [(int(r), int(c)) for r, c in coords]
-                paths.append(path)
-        return paths
+        return mapf_io.parse_paths_file(filename)
     
     def call_pathfinder(self, starts: List[Tuple[int, int]], goals: List[Tuple[int, int]]) -> Optional[List[List[Tuple[int, int]]]]:
         """Call the C++ pathfinder with given starts and goals"""
@@ -217,39 +240,30 @@ class DynamicMAPFVisualizer:
             self.write_scen_file(scen_path, starts, goals)
             
             # Call the existing C++ executable
-            lns_exec = './lns'
-            cmd = [
-                lns_exec, '--map', self.map_file, '--agents', scen_path, 
-                '--agentNum', str(num_agents), '--outputPaths', out_path, 
-                '--cutoffTime', '30'  # Shorter timeout for dynamic planning
-            ]
-            
             try:
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=35)
-                if os.path.exists(out_path):
-                    paths = self.parse_paths_file(out_path)
-                    
-                    # Adjust timing for new agents to start from timestep 0
-                    if len(self.agents) > 0 and len(paths) > len(self.agents):
-                        # This means we added new agents
-                        current_time = self.frame
-                        adjusted_paths = []
+                paths = mapf_io.run_lns(self.map_file, scen_path, num_agents, out_path,
+                                        cutoff_time=30)  # Shorter timeout for dynamic planning
+                # Adjust timing for new agents to start from timestep 0
+                if len(self.agents) > 0 and len(paths) > len(self.agents):
+                    # This means we added new agents
+                    current_time = self.frame
+                    adjusted_paths = []
                         
-                        for i, path in enumerate(paths):
-                            if i < len(self.agents):
-                                # Existing agents keep their paths
-                                adjusted_paths.append(path)
-                            else:
-                                # New agents start from timestep 0
-                                # Pad the beginning with their start position
-                                start_pos = starts[i]
-                                padding = [start_pos] * current_time
-                                adjusted_path = padding + path
-                                adjusted_paths.append(adjusted_path)
+                    for i, path in enumerate(paths):
+                        if i < len(self.agents):
+                            # Existing agents keep their paths
+                            adjusted_paths.append(path)
+                        else:
+                            # New agents start from timestep 0
+                            # Pad the beginning with their start position
+                            start_pos = starts[i]
+                            padding = [start_pos] * current_time
+                            adjusted_path = padding + path
+                            adjusted_paths.append(adjusted_path)
                         
-                        return adjusted_paths
-                    else:
-                        return paths
+                    return adjusted_paths
+                else:
+                    return paths
             except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError) as e:
                 print(f"Pathfinding error: {e}")
                 return None
@@ -258,6 +272,27 @@ class DynamicMAPFVisualizer:
     
     def add_agent(self, start: Optional[Tuple[int, int]], goal: Optional[Tuple[int, int]]):
         """Add a new agent and replan all paths (global replanning for all agents)."""
+        if not self._append_agent(start, goal, self._occupied_cells()):
+            return False
+        self._recolor_agents()
+        self.replan_all_paths()
+        return True
+
+    def _occupied_cells(self):
+        """Map every agent's start and goal cell to the agent"""
+        occupied = {}
+        for agent in self.agents:
+            occupied[agent[0]] = agent
+            occupied[agent[1]] = agent
+        return occupied
+
+    def _recolor_agents(self):
+        colors = self.get_agent_colors(len(self.agents))
+        for i, (start, goal, path, _, agent_id) in enumerate(self.agents):
+            self.agents[i] = (start, goal, path, colors[i], agent_id)
+
+    def _append_agent(self, start, goal, occupied) -> bool:
+        """Validate and append an agent without replanning; ``occupied`` is updated in place"""
         if start is None or goal is None:
             print("Start or goal is None, cannot add agent.")
             return False
@@ -265,27 +300,94 @@ class DynamicMAPFVisualizer:
             print("Cannot place agent on obstacle")
             return False
         # Check if positions are already occupied
-        for agent in self.agents:
-            if start == agent[0] or start == agent[1] or goal == agent[0] or goal == agent[1]:
+        for cell in (start, goal):
+            if cell in occupied:
+                agent = occupied[cell]
                 print(f"Position already occupied: new agent start={start}, goal={goal} conflicts with agent id={agent[4]}, start={agent[0]}, goal={agent[1]}")
                 return False
         agent_id = self.next_agent_id
         self.next_agent_id += 1
         temp_path = [start]  # Temporary path until replanning
-        self.agents.append((start, goal, temp_path, (0,0,0), agent_id))
-        colors = self.get_agent_colors(len(self.agents))
-        for i in range(len(self.agents)):
-            start, goal, path, _, agent_id = self.agents[i]
-            self.agents[i] = (start, goal, path, colors[i], agent_id)
+        agent = (start, goal, temp_path, (0,0,0), agent_id)
+        self.agents.append(agent)
+        self.reservations = None
+        occupied[start] = occupied[goal] = agent
         # Pad the new agent's history with its start position for all previous timesteps
         if hasattr(self, 'agent_histories') and self.agent_histories and len(self.agent_histories[0]) > 0 and len(self.agent_histories[0][0]) == 3:
             pad = (start[0], start[1], 0)
         else:
             pad = start if len(start) == 3 else (start[0], start[1], 0)
         self.agent_histories.append([pad] * self.global_timestep)
-        self.replan_all_paths()
         return True
 
+    def remove_agent(self, agent_id: int) -> bool:
+        """Remove an agent, freeing its reservations without replanning anyone else"""
+        index = self._agent_index(agent_id)
+        if index is None:
+            print(f"No agent with id {agent_id}")
+            return False
+        self._reservation_table().remove(agent_id)
+        del self.agents[index]
+        del self.agent_histories[index]
+        self._paths_changed()
+        print(f"Removed agent {agent_id}")
+        return True
+
+    def change_goal(self, agent_id: int, goal: Tuple[int, int]) -> bool:
+        """Send an agent to a new goal, repairing only its path and those of agents it now conflicts with"""
+        index = self._agent_index(agent_id)
+        if index is None:
+            print(f"No agent with id {agent_id}")
+            return False
+        if goal in self.obstacles:
+            print("Cannot place goal on obstacle")
+            return False
+        for other in self.agents:
+            if other[4] != agent_id and other[1] == goal:
+                print(f"Goal {goal} is already the goal of agent id={other[4]}")
+                return False
+        start, _, path, color, _ = self.agents[index]
+        self.agents[index] = (start, goal, path, color, agent_id)
+        paths = {agent[4]: agent[2] for agent in self.agents}
+        repaired = local_repair.repair_goal_change(self._reservation_table(), self.grid, paths, agent_id, goal, self.frame)
+        if repaired is None:
+            print(f"Local repair failed for agent {agent_id}, replanning all paths")
+            self.reservations = None  # The failed repair left the table stale, even if the replan fails too
+            self.replan_all_paths()
+            return True
+        for i, (other_start, other_goal, _, other_color, other_id) in enumerate(self.agents):
+            if other_id in repaired:
+                self.agents[i] = (other_start, other_goal, repaired[other_id], other_color, other_id)
+                self.agent_histories[i] = list(repaired[other_id])
+        self._paths_changed()
+        print(f"Agent {agent_id} heading to {goal}, repaired {len(repaired)} path(s)")
+        return True
+
+    def _agent_index(self, agent_id: int) -> Optional[int]:
+        for i, agent in enumerate(self.agents):
+            if agent[4] == agent_id:
+                return i
+        return None
+
+    def _agent_at(self, cell: Tuple[int, int]) -> Optional[int]:
+        """Id of the agent standing on ``cell`` at the current timestep"""
+        for start, goal, path, color, agent_id in self.agents:
+            if path and tuple(path[min(self.frame, len(path) - 1)][:2]) == cell:
+                return agent_id
+        return None
+
+    def _reservation_table(self) -> local_repair.ReservationTable:
+        if self.reservations is None:
+            self.reservations = local_repair.ReservationTable({agent[4]: agent[2] for agent in self.agents}, self.grid.shape)
+        return self.reservations
+
+    def _paths_changed(self):
+        """Refresh what depends on the paths after a local change"""
+        self.makespan = max((len(agent[2]) for agent in self.agents), default=1) or 1
+        self.frame = min(self.frame, self.makespan - 1)
+        self.write_paths_txt()
+        self.invalidate_analytics()
+
     def check_collisions(self):
         """Check for collisions between agents (vertex and edge), ignoring orientation for vertex collisions"""
         collisions = []
@@ -346,9 +448,12 @@ class DynamicMAPFVisualizer:
                     self.agent_histories[i] = list(new_paths[i])
             self.makespan = max(len(agent[2]) for agent in self.agents) if self.agents else 1
             self.frame = 0
+            self.sim_clock.reset()
+            self.reservations = None
             print(f"Replanned paths for {len(self.agents)} agents, makespan: {self.makespan}")
             self.check_collisions()
             self.write_paths_txt()
+            self.invalidate_analytics()
         else:
             print("Pathfinding failed, keeping existing paths")
     
@@ -362,19 +467,36 @@ class DynamicMAPFVisualizer:
                     self.paused = not self.paused
                 elif event.key == pygame.K_RIGHT:
                     self.frame = min(self.frame + 1, self.makespan - 1)
+                    self.sim_clock.reset()
                 elif event.key == pygame.K_LEFT:
                     self.frame = max(self.frame - 1, 0)
+                    self.sim_clock.reset()
+                elif event.key == pygame.K_UP:
+                    print(f"Simulation speed: {self.sim_clock.faster():g}x")
+                elif event.key == pygame.K_DOWN:
+                    print(f"Simulation speed: {self.sim_clock.slower():g}x")
                 elif event.key == pygame.K_ESCAPE:
                     self.running = False
-                elif event.key == pygame.K_a:
-                    # Start selecting a new agent
+                elif event.key in (pygame.K_a, pygame.K_r, pygame.K_d, pygame.K_g) and self.session_client:
+                    print("Attached read-only to a planning session; change agents and replan through the server API")
+                elif event.key in (pygame.K_a, pygame.K_d, pygame.K_g):
+                    # Start selecting a new agent, an agent to remove, or an agent to redirect
                     self.selecting = True
                     self.select_stage = 1
+                    self.select_action = {pygame.K_a: 'add', pygame.K_d: 'remove', pygame.K_g: 'goal'}[event.key]
+                    self.selected_agent = None
                     self.new_start = None
                     self.new_goal = None
                 elif event.key == pygame.K_r:
                     # Replan all paths
                     self.replan_all_paths()
+                elif event.key == pygame.K_h:
+                    self.cycle_heatmap()
+                elif event.key == pygame.K_e:
+                    if self.analytics is None:
+                        self.update_analytics()
+                    self.analytics.save("analytics.npz")
+                    print("Saved path analytics to analytics.npz")
                 elif event.key == pygame.K_c:
                     # Manual collision check
                     print(f"\n🔍 Manual collision check at timestep {self.frame}:")
@@ -382,7 +504,25 @@ class DynamicMAPFVisualizer:
             elif event.type == pygame.MOUSEBUTTONDOWN and self.selecting:
                 pos = pygame.mouse.get_pos()
                 grid_pos = self.grid_pos_from_mouse(pos)
-                if grid_pos and grid_pos not in self.obstacles:
+                if grid_pos and grid_pos not in self.obstacles and self.select_action != 'add':
+                    if self.select_stage == 1:
+                        self.selected_agent = self._agent_at(grid_pos)
+                        if self.selected_agent is None:
+                            print(f"No agent at {grid_pos}")
+                        elif self.select_action == 'remove':
+                            self.remove_agent(self.selected_agent)
+                            self.selecting = False
+                            self.select_stage = 0
+                        else:
+                            self.new_start = grid_pos
+                            self.select_stage = 2
+                    elif self.select_stage == 2:
+                        self.change_goal(self.selected_agent, grid_pos)
+                        self.selecting = False
+                        self.select_stage = 0
+                        self.selected_agent = None
+                        self.new_start = None
+                elif grid_pos and grid_pos not in self.obstacles:
                     if self.select_stage == 1:
                         self.new_start = grid_pos
                         self.select_stage = 2
@@ -415,7 +555,13 @@ class DynamicMAPFVisualizer:
                             self.cell_size, self.cell_size))
     
     def draw_agents(self):
-        """Draw all agents (optimized: only draw path up to current frame)"""
+        """Draw all agents (optimized: only draw path up to current frame)
+
+        Positions and headings are interpolated between the current and next
+        timestep using the simulation clock's alpha, so motion stays smooth
+        at any speed multiplier.
+        """
+        alpha = self.sim_clock.alpha if not self.paused and self.frame + 1 < self.makespan else 0.0
         for start, goal, path, color, agent_id in self.agents:
             # Draw start and goal markers (unchanged)
             start_pos = (self.margin + start[1] * self.cell_size + self.cell_size // 2,
@@ -431,40 +577,37 @@ class DynamicMAPFVisualizer:
                 y2 = int(goal_pos[1] + self.cell_size // 8 * np.sin(np.radians(angle + 36)))
                 pygame.draw.line(self.screen, color, goal_pos, (x1, y1), 2)
                 pygame.draw.line(self.screen, color, goal_pos, (x2, y2), 2)
-            # Draw path trail (only up to current frame)
+            if not path:
+                continue
+            # Interpolated pose between the current and next timestep
+            entry = path[min(self.frame, len(path) - 1)]
+            next_entry = path[min(self.frame + 1, len(path) - 1)]
+            row, col, angle = interpolate_pose(entry, next_entry, alpha)
+            pos_pix = (self.margin + col * self.cell_size + self.cell_size / 2,
+                      self.margin + row * self.cell_size + self.cell_size / 2)
+            # Draw path trail (only up to current frame, ending at the interpolated position)
             if len(path) > 1:
                 trail = path[:min(self.frame + 1, len(path))]
-                if len(trail) >= 2:
-                    points = [(self.margin + c * self.cell_size + self.cell_size // 2,
-                              self.margin + r * self.cell_size + self.cell_size // 2) for r, c, *_ in trail]
-                    pygame.draw.lines(self.screen, color, False, points, max(2, self.cell_size // 15))
+                points = [(self.margin + c * self.cell_size + self.cell_size // 2,
+                          self.margin + r * self.cell_size + self.cell_size // 2) for r, c, *_ in trail]
+                points.append(pos_pix)
+                pygame.draw.lines(self.screen, color, False, points, max(2, self.cell_size // 15))
             # Draw current position and orientation
-            if path:
-                entry = path[min(self.frame, len(path) - 1)]
-                if len(entry) == 3:
-                    r, c, orientation = entry
-                else:
-                    r, c = entry
-                    orientation = 0  # fallback if orientation missing
-                pos_pix = (self.margin + c * self.cell_size + self.cell_size // 2,
-                          self.margin + r * self.cell_size + self.cell_size // 2)
-                pygame.draw.circle(self.screen, color, pos_pix, max(8, self.cell_size // 2 - 2))
-                # Draw orientation arrow/triangle
-                arrow_len = self.cell_size // 2 - 4
-                angle_map = {0: -90, 1: 0, 2: 90, 3: 180}  # N, E, S, W
-                angle = angle_map.get(orientation, 0)
-                # Triangle points
-                tip = (pos_pix[0] + arrow_len * np.cos(np.radians(angle)),
-                       pos_pix[1] + arrow_len * np.sin(np.radians(angle)))
-                left = (pos_pix[0] + (arrow_len // 2) * np.cos(np.radians(angle + 120)),
-                        pos_pix[1] + (arrow_len // 2) * np.sin(np.radians(angle + 120)))
-                right = (pos_pix[0] + (arrow_len // 2) * np.cos(np.radians(angle - 120)),
-                         pos_pix[1] + (arrow_len // 2) * np.sin(np.radians(angle - 120)))
-                pygame.draw.polygon(self.screen, (0, 0, 0), [tip, left, right])
-                # Agent number
-                text = self.font.render(str(agent_id), True, (255, 255, 255))
-                text_rect = text.get_rect(center=pos_pix)
-                self.screen.blit(text, text_rect)
+            pygame.draw.circle(self.screen, color, pos_pix, max(8, self.cell_size // 2 - 2))
+            # Draw orientation arrow/triangle
+            arrow_len = self.cell_size // 2 - 4
+            # Triangle points
+            tip = (pos_pix[0] + arrow_len * np.cos(np.radians(angle)),
+                   pos_pix[1] + arrow_len * np.sin(np.radians(angle)))
+            left = (pos_pix[0] + (arrow_len // 2) * np.cos(np.radians(angle + 120)),
+                    pos_pix[1] + (arrow_len // 2) * np.sin(np.radians(angle + 120)))
+            right = (pos_pix[0] + (arrow_len // 2) * np.cos(np.radians(angle - 120)),
+                     pos_pix[1] + (arrow_len // 2) * np.sin(np.radians(angle - 120)))
+            pygame.draw.polygon(self.screen, (0, 0, 0), [tip, left, right])
+            # Agent number
+            text = self.font.render(str(agent_id), True, (255, 255, 255))
+            text_rect = text.get_rect(center=pos_pix)
+            self.screen.blit(text, text_rect)
     
     def draw_legend(self):
         """Draw legend and UI elements"""
@@ -482,12 +625,13 @@ class DynamicMAPFVisualizer:
             agent_label = self.small_font.render(f'Agent {agent_id}', True, (0, 0, 0))
             self.screen.blit(agent_label, (legend_x + 40, y_pos - 10))
         
-        # Timestep
-        timestep_text = self.font.render(f'Timestep: {self.frame}', True, (0, 0, 0))
+        # Timestep and speed
+        heatmap_label = f'   Heatmap: {self.heatmap_metric}' if self.heatmap_metric else ''
+        timestep_text = self.font.render(f'Timestep: {self.frame}   Speed: {self.sim_clock.speed:g}x   FPS: {self.clock.get_fps():.0f}{heatmap_label}', True, (0, 0, 0))
         self.screen.blit(timestep_text, (self.margin, 10))
         
         # Instructions
-        instr = self.small_font.render('SPACE: Pause/Play   ←/→: Step   ESC: Quit   A: Add Agent   R: Replan   C: Check Collisions', True, (80, 80, 80))
+        instr = self.small_font.render('SPACE: Pause/Play   ←/→: Step   ↑/↓: Speed   ESC: Quit   A: Add Agent   D: Remove Agent   G: Change Goal   R: Replan   C: Check Collisions   H: Heatmap   E: Export Analytics', True, (80, 80, 80))
         self.screen.blit(instr, (self.margin, self.height - 30))
         
         # Selection feedback
@@ -508,60 +652,85 @@ class DynamicMAPFVisualizer:
                                 self.margin + self.new_goal[0] * self.cell_size, 
                                 self.cell_size, self.cell_size), 3)
     
-    def update(self):
-        """Update simulation state"""
-        if not self.paused:
+    def update(self, dt: float):
+        """Advance the simulation by however many timesteps ``dt`` real seconds cover.
+
+        Several timesteps may be simulated for one rendered frame when the
+        speed multiplier outruns the render rate (frame skipping).
+        """
+        if self.session_client:
+            self.apply_session_state()
+        if self.paused:
+            return
+        steps = self.sim_clock.advance(dt)
+        if not steps:
+            return
+        before = self.global_timestep
+        for _ in range(steps):
+            self.step()
+        # Check for collisions at most once per rendered frame, and only every 10 timesteps to avoid spam
+        if self.global_timestep // 10 > before // 10:
+            self.check_collisions_at_timestep(self.frame)
+
+    def step(self):
+        """Advance the simulation by exactly one timestep"""
+        if self.session_client:
+            # Sessions stop at the end of the plan instead of looping
+            self.frame = min(self.frame + 1, self.makespan - 1)
+        else:
             self.frame = (self.frame + 1) % self.makespan
-            self.global_timestep += 1
-            
-            # Check for collisions at current timestep (only log occasionally to avoid spam)
-            if self.frame % 10 == 0:  # Check every 10 timesteps
-                self.check_collisions_at_timestep(self.frame)
-            
-            # Check if all agents have reached their goals
-            all_at_goals = True
-            for start, goal, path, color, agent_id in self.agents:
-                if path and len(path) > 0:
-                    current_pos = path[min(self.frame, len(path) - 1)]
-                    if current_pos != goal:
-                        all_at_goals = False
-                        break
-                else:
-                    all_at_goals = False
-                    break
-            
-            # If all agents are at goals, you could add a completion message or restart
-            if all_at_goals and self.agents:
-                # Optional: Add a completion indicator
-                pass
-    
+        self.global_timestep += 1
+
     def check_collisions_at_timestep(self, timestep):
-        """Check for collisions at a specific timestep, ignoring orientation for vertex collisions"""
+        """Check for collisions at a specific timestep, ignoring orientation for vertex collisions.
+
+        Only agents whose path reaches ``timestep`` are considered. Vertex
+        collisions are found by sorting cell indices and swaps by matching
+        each move against the reverse moves, so the check stays cheap for
+        thousands of agents.
+        """
+        ncols = self.grid.shape[1]
+        current, following, ids = [], [], []
+        for start, goal, path, color, agent_id in self.agents:
+            if timestep < len(path):
+                current.append(path[timestep][:2])
+                following.append(path[timestep + 1][:2] if timestep + 1 < len(path) else None)
+                ids.append(agent_id)
         collisions = []
-        for i, (start1, goal1, path1, color1, agent_id1) in enumerate(self.agents):
-            for j, (start2, goal2, path2, color2, agent_id2) in enumerate(self.agents):
-                if i >= j:
-                    continue
-                if timestep < len(path1) and timestep < len(path2):
-                    pos1 = path1[timestep]
-                    pos2 = path2[timestep]
-                    # Check vertex collision (ignore orientation)
-                    if pos1[:2] == pos2[:2]:
+        if len(current) > 1:
+            cells = np.array(current, dtype=np.int64)
+            cells = cells[:, 0] * ncols + cells[:, 1]
+            shared, counts = np.unique(cells, return_counts=True)
+            for cell in shared[counts > 1].tolist():
+                group = np.flatnonzero(cells == cell).tolist()
+                for k, a in enumerate(group):
+                    for b in group[k + 1:]:
                         collisions.append({
                             'type': 'vertex',
-                            'agents': (agent_id1, agent_id2),
-                            'position': pos1[:2],
+                            'agents': (ids[a], ids[b]),
+                            'position': tuple(current[a]),
                             'timestep': timestep
                         })
-                    # Check edge collision (ignore orientation)
-                    if timestep + 1 < len(path1) and timestep + 1 < len(path2):
-                        next_pos1 = path1[timestep + 1]
-                        next_pos2 = path2[timestep + 1]
-                        if (pos1[:2] == next_pos2[:2] and pos2[:2] == next_pos1[:2]):
+
+            # Swaps: one agent moves u -> v while another moves v -> u
+            movers = [i for i, nxt in enumerate(following) if nxt is not None and tuple(nxt) != tuple(current[i])]
+            if len(movers) > 1:
+                nxt = np.array([following[i] for i in movers], dtype=np.int64)
+                u, v = cells[movers], nxt[:, 0] * ncols + nxt[:, 1]
+                num_cells = self.grid.size
+                fwd, rev = u * num_cells + v, v * num_cells + u
+                swapped = np.flatnonzero(np.isin(fwd, rev)).tolist()
+                by_move = {}
+                for i in swapped:
+                    by_move.setdefault(int(fwd[i]), []).append(i)
+                for i in swapped:
+                    for j in by_move[int(rev[i])]:
+                        if i < j:
+                            a, b = movers[i], movers[j]
                             collisions.append({
                                 'type': 'edge',
-                                'agents': (agent_id1, agent_id2),
-                                'positions': (pos1[:2], next_pos1[:2]),
+                                'agents': (ids[a], ids[b]),
+                                'positions': (tuple(current[a]), tuple(following[a])),
                                 'timestep': timestep
                             })
         if collisions:
@@ -606,26 +775,52 @@ class DynamicMAPFVisualizer:
                 self.draw_loading()
                 self.clock.tick(10)
                 continue
-            self.update()
+            # Render at a fixed frame rate; the simulation clock decides how many timesteps that covers
+            dt = self.clock.tick(self.render_fps if not self.paused else 15) / 1000.0
+            self.update(dt)
             self.draw()
-            
-            if not self.paused:
-                self.clock.tick(self.speed)
-            else:
-                self.clock.tick(15)
         
         pygame.quit()
     
     def write_paths_txt(self):
-        with open("paths.txt", "w") as f:
-            for i, history in enumerate(self.agent_histories):
-                def format_entry(entry):
-                    if len(entry) == 3:
-                        return f"({entry[0]},{entry[1]},{entry[2]})"
-                    else:
-                        return f"({entry[0]},{entry[1]})"
-                path_str = " -> ".join(format_entry(e) for e in history)
-                f.write(f"Agent {i}: {path_str}\n")
+        mapf_io.write_paths_file("paths.txt", self.agent_histories)
+
+    def apply_session_state(self):
+        """Adopt the latest state polled from the planning server"""
+        state, self.session_state = self.session_state, None
+        if state is None:
+            return
+        if 'paths' in state:
+            paths = [[tuple(entry) for entry in path] for path in state['paths']]
+            colors = self.get_agent_colors(len(paths))
+            self.agents = [(tuple(agent['start']), tuple(agent['goal']), path, colors[i], agent['id'])
+                           for i, (agent, path) in enumerate(zip(state['agents'], paths))]
+            self.agent_histories = [list(path) for path in paths]
+            self.invalidate_analytics()
+        self.makespan = max(1, state['makespan'])
+        self.sim_clock.set_speed(state['speed'])
+        self.paused = state['paused'] or state['status'] == 'planning'
+        # Only jump to the server's clock on a new plan or real drift, so polling does not make agents stutter
+        server_time = state['timestep'] + state.get('alpha', 0.0)
+        local_time = self.frame + self.sim_clock.alpha
+        if 'paths' in state or self.paused or abs(server_time - local_time) > SESSION_DRIFT_STEPS:
+            self.frame = min(state['timestep'], self.makespan - 1)
+            self.sim_clock.accumulator = state.get('alpha', 0.0)
+
+    def _poll_session_thread(self, interval: float = 0.5):
+        version = None
+        while self.running:
+            try:
+                state = self.session_client.get_state(since_version=version)
+                version = state['version']
+                unapplied = self.session_state  # Read once: the main loop may take it at any moment
+                if unapplied is not None and 'paths' in unapplied and 'paths' not in state:
+                    state['paths'] = unapplied['paths']  # Keep a plan the main loop has not applied yet
+                    state['agents'] = unapplied['agents']
+                self.session_state = state
+            except (OSError, ValueError) as e:
+                print(f"Session poll failed: {e}")
+            time.sleep(interval)
 
     def _load_initial_agents_thread(self, scen_file, agent_num):
         try:
@@ -637,8 +832,16 @@ class DynamicMAPFVisualizer:
 def main():
     if len(sys.argv) < 2:
         print("Usage: python3 dynamic_visualizer.py <map_file> [scen_file] [agent_num]")
+        print("       python3 dynamic_visualizer.py --attach <session_url>")
         sys.exit(1)
     
+    if sys.argv[1] == '--attach' and len(sys.argv) > 2:
+        from planning_server import SessionClient
+        client = SessionClient(sys.argv[2])
+        visualizer = DynamicMAPFVisualizer(client.get_state()['map_file'], session_client=client)
+        visualizer.run()
+        return
+    
     map_file = sys.argv[1]
     scen_file = sys.argv[2] if len(sys.argv) > 2 else None
     agent_num = int(sys.argv[3]) if len(sys.argv) > 3 else 0
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Render a planned MAPF run offscreen to a PNG sequence or an MP4.
+
+Frames are drawn without a window and split across a process pool. The
+(row, col, orientation) path array is placed in shared memory once, so
+workers read it without copying, and each worker renders whole frames
+independently. MP4 output is streamed in order to a local ``ffmpeg``.
+
+Usage:
+    python3 export_frames.py <map_file> <output> --paths paths.txt
+    python3 export_frames.py <map_file> <output> --scen <scen_file> --agent-num N
+
+``output`` ending in ``.mp4`` (or another video extension) is encoded with
+ffmpeg; anything else is treated as a directory for ``frame_00000.png`` ...
+"""
+
+import argparse
+import math
+import multiprocessing as mp
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from multiprocessing import shared_memory
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # Never open a window
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+import pygame
+
+import mapf_io
+from dynamic_visualizer import AGENT_COLORS
+from sim_clock import ORIENTATION_ANGLES
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.webm')
+_HEADINGS = np.array([ORIENTATION_ANGLES[o] for o in range(4)])
+
+
+class FrameRenderer:
+    """Draws single frames of a plan onto an offscreen surface, in the visualizer's style"""
+
+    def __init__(self, grid: np.ndarray, states: np.ndarray, cell_size: int, substeps: int = 1, trails: bool = True):
+        self.grid = grid
+        self.states = states  # (num_agents, makespan, 3), read-only
+        self.nrows, self.ncols = grid.shape
+        self.cell_size = cell_size
+        self.substeps = substeps
+        self.trails = trails
+        self.margin = max(10, cell_size)
+        self.header = 24
+        self.width, self.height = self.frame_size(grid.shape, cell_size)
+        self.colors = [AGENT_COLORS[i % len(AGENT_COLORS)] for i in range(len(states))]
+        pygame.font.init()
+        self.font = pygame.font.SysFont('Arial', 18)
+        self.id_font = pygame.font.SysFont('Arial', max(10, cell_size // 3)) if cell_size >= 16 else None
+        self.background = self._create_background()
+
+    @staticmethod
+    def frame_size(grid_shape, cell_size: int):
+        """(width, height) in pixels of a frame for a grid of the given shape"""
+        nrows, ncols = grid_shape
+        margin = max(10, cell_size)
+        return ncols * cell_size + margin * 2, nrows * cell_size + margin * 2 + 24
+
+    def centers(self, states: np.ndarray) -> np.ndarray:
+        """Pixel centres (x, y) of a slice of path states.
+
+        Computed per frame from the shared array rather than cached, so a
+        worker never holds its own copy of the whole plan.
+        """
+        offset = self.margin + self.cell_size // 2
+        return np.stack([offset + states[..., 1] * self.cell_size,
+                         self.header + offset + states[..., 0] * self.cell_size], axis=-1)
+
+    @property
+    def num_frames(self) -> int:
+        return (self.states.shape[1] - 1) * self.substeps + 1
+
+    def _create_background(self) -> pygame.Surface:
+        """Draw static grid and obstacles once"""
+        surface = pygame.Surface((self.width, self.height))
+        surface.fill((255, 255, 255))
+        top = self.header + self.margin
+        for r, c in zip(*np.nonzero(self.grid)):
+            pygame.draw.rect(surface, (0, 0, 0),
+                (self.margin + c * self.cell_size, top + r * self.cell_size, self.cell_size, self.cell_size))
+        if self.cell_size >= 4:
+            for x in range(self.ncols + 1):
+                pygame.draw.line(surface, (200, 200, 200),
+                    (self.margin + x * self.cell_size, top),
+                    (self.margin + x * self.cell_size, top + self.nrows * self.cell_size), 1)
+            for y in range(self.nrows + 1):
+                pygame.draw.line(surface, (200, 200, 200),
+                    (self.margin, top + y * self.cell_size),
+                    (self.margin + self.ncols * self.cell_size, top + y * self.cell_size), 1)
+        if self.cell_size >= 8:
+            goals = self.centers(self.states[:, -1]).tolist()
+            for color, goal in zip(self.colors, goals):
+                for angle in range(0, 360, 72):
+                    x1 = int(goal[0] + self.cell_size // 4 * np.cos(np.radians(angle)))
+                    y1 = int(goal[1] + self.cell_size // 4 * np.sin(np.radians(angle)))
+                    pygame.draw.line(surface, color, goal, (x1, y1), 2)
+        return surface
+
+    def render(self, frame: int) -> pygame.Surface:
+        """Draw frame ``frame``; with substeps > 1, frames between timesteps are interpolated"""
+        t, sub = divmod(frame, self.substeps)
+        t_next = min(t + 1, self.states.shape[1] - 1)
+        alpha = sub / self.substeps
+        surface = self.background.copy()
+        current = self.centers(self.states[:, t])
+        pos = current + (self.centers(self.states[:, t_next]) - current) * alpha
+        o0 = self.states[:, t, 2]
+        turns = (self.states[:, t_next, 2] - o0 + 1) % 4 - 1
+        angles = np.radians(_HEADINGS[o0 % 4] + 90.0 * turns * alpha)
+        radius = max(2, self.cell_size // 2 - 2)
+        line_width = max(1, self.cell_size // 15)
+        for i, color in enumerate(self.colors):
+            center = (float(pos[i, 0]), float(pos[i, 1]))
+            if self.trails and t > 0:
+                points = self.centers(self.states[i, :t + 1]).tolist()
+                points.append(center)
+                pygame.draw.lines(surface, color, False, points, line_width)
+            pygame.draw.circle(surface, color, center, radius)
+            if self.cell_size >= 8:
+                arrow_len = self.cell_size // 2 - 4
+                a = angles[i]
+                tip = (center[0] + arrow_len * math.cos(a), center[1] + arrow_len * math.sin(a))
+                left = (center[0] + (arrow_len // 2) * math.cos(a + 2.0944), center[1] + (arrow_len // 2) * math.sin(a + 2.0944))
+                right = (center[0] + (arrow_len // 2) * math.cos(a - 2.0944), center[1] + (arrow_len // 2) * math.sin(a - 2.0944))
+                pygame.draw.polygon(surface, (0, 0, 0), [tip, left, right])
+            if self.id_font:
+                text = self.id_font.render(str(i), True, (255, 255, 255))
+                surface.blit(text, text.get_rect(center=center))
+        label = self.font.render(f'Timestep: {t}', True, (0, 0, 0))
+        surface.blit(label, (self.margin, 4))
+        return surface
+
+
+# Per-worker state, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(shm_name, shape, grid, cell_size, substeps, trails, frame_dir):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    states = np.ndarray(shape, dtype=np.int32, buffer=shm.buf)
+    states.flags.writeable = False
+    _worker['shm'] = shm  # Keep the mapping alive for the life of the worker
+    _worker['renderer'] = FrameRenderer(grid, states, cell_size, substeps, trails)
+    _worker['frame_dir'] = frame_dir
+
+
+def _render_png(frame):
+    path = os.path.join(_worker['frame_dir'], f'frame_{frame:05d}.png')
+    pygame.image.save(_worker['renderer'].render(frame), path)
+    return path
+
+
+def _render_raw(frame):
+    return pygame.image.tostring(_worker['renderer'].render(frame), 'RGB')
+
+
+def default_cell_size(nrows: int, ncols: int) -> int:
+    """Largest cell size (up to the visualizer's 60px) that keeps the frame within ~1600px"""
+    return max(2, min(60, 1600 // max(nrows, ncols)))
+
+
+def export(grid: np.ndarray, paths, output: str, fps: int = 10, substeps: int = 1,
+           cell_size: int = None, workers: int = None, trails: bool = True) -> int:
+    """Render ``paths`` on ``grid`` to ``output`` and return the number of frames written"""
+    states, _ = mapf_io.paths_to_array(paths)
+    cell_size = cell_size or default_cell_size(*grid.shape)
+    workers = workers or os.cpu_count() or 1
+    to_video = output.lower().endswith(VIDEO_EXTENSIONS)
+    if to_video and shutil.which('ffmpeg') is None:
+        raise RuntimeError("ffmpeg not found on PATH; export to a directory for PNG frames instead")
+    if not to_video:
+        os.makedirs(output, exist_ok=True)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(states.nbytes, 1))
+    try:
+        shared = np.ndarray(states.shape, dtype=np.int32, buffer=shm.buf)
+        shared[:] = states
+        # The main process needs the frame geometry only, not a full renderer
+        width, height = FrameRenderer.frame_size(grid.shape, cell_size)
+        num_frames = (states.shape[1] - 1) * substeps + 1
+        chunksize = max(1, num_frames // (workers * 8))
+        init_args = (shm.name, states.shape, grid, cell_size, substeps, trails, None if to_video else output)
+        with mp.Pool(workers, initializer=_init_worker, initargs=init_args) as pool:
+            if to_video:
+                cmd = [
+                    'ffmpeg', '-y', '-loglevel', 'error',
+                    '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+                    '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',  # libx264 needs even dimensions
+                    '-c:v', 'libx264', '-pix_fmt', 'yuv420p', output
+                ]
+                # stderr goes to a file so a chatty ffmpeg can never block on a full pipe
+                with tempfile.TemporaryFile() as errors:
+                    ffmpeg = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=errors)
+                    pipe_error = None
+                    try:
+                        try:
+                            # imap keeps frames in order while workers render ahead
+                            for raw in pool.imap(_render_raw, range(num_frames), chunksize):
+                                ffmpeg.stdin.write(raw)
+                        finally:
+                            ffmpeg.stdin.close()
+                    except OSError as e:  # BrokenPipeError when ffmpeg exits early
+                        pipe_error = e
+                    finally:
+                        returncode = ffmpeg.wait()
+                    if returncode != 0 or pipe_error:
+                        errors.seek(0)
+                        message = errors.read().decode(errors='replace').strip() or pipe_error
+                        raise RuntimeError(f"ffmpeg exited with code {returncode}: {message}")
+            else:
+                for _ in pool.imap_unordered(_render_png, range(num_frames), chunksize):
+                    pass
+        return num_frames
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def solve(map_file: str, scen_file: str, agent_num: int, cutoff_time: float):
+    """Run the solver on a scenario and return its paths"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        return mapf_io.run_lns(map_file, scen_file, agent_num, os.path.join(tmpdir, 'paths.txt'), cutoff_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a MAPF plan offscreen to PNG frames or an MP4")
+    parser.add_argument('map_file')
+    parser.add_argument('output', help="Directory for PNG frames, or a .mp4 file")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--paths', help="Paths file written by lns or the visualizer")
+    source.add_argument('--scen', help="Scenario to solve with ./lns before exporting")
+    parser.add_argument('--agent-num', type=int, default=None, help="Number of agents to solve (with --scen)")
+    parser.add_argument('--cutoff-time', type=float, default=60)
+    parser.add_argument('--fps', type=int, default=10, help="Video frame rate")
+    parser.add_argument('--substeps', type=int, default=1, help="Interpolated frames per timestep")
+    parser.add_argument('--cell-size', type=int, default=None, help="Pixels per cell (default: fit to ~1600px)")
+    parser.add_argument('--workers', type=int, default=None, help="Render processes (default: all cores)")
+    parser.add_argument('--no-trails', action='store_true', help="Do not draw path trails")
+    args = parser.parse_args()
+
+    grid = mapf_io.load_grid(args.map_file)
+    if args.paths:
+        paths = mapf_io.parse_paths_file(args.paths)
+    else:
+        agent_num = args.agent_num or len(mapf_io.load_scen_array(args.scen))
+        try:
+            paths = solve(args.map_file, args.scen, agent_num, args.cutoff_time)
+        except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError) as e:
+            print(f"Pathfinding error: {e}")
+            sys.exit(1)
+    if not paths:
+        print("No paths to export")
+        sys.exit(1)
+
+    try:
+        num_frames = export(grid, paths, args.output, fps=args.fps, substeps=max(1, args.substeps),
+                            cell_size=args.cell_size, workers=args.workers, trails=not args.no_trails)
+    except RuntimeError as e:
+        print(f"Export error: {e}")
+        sys.exit(1)
+    print(f"Exported {num_frames} frames for {len(paths)} agents to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
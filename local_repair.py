@@ -0,0 +1,377 @@
+"""Local repair of a running plan when agents leave or are sent to new goals.
+
+A full replan costs a solver run over the whole fleet. Removing an agent or
+changing one agent's goal only disturbs a small part of the plan, so these
+helpers keep a ``ReservationTable`` of every agent's space-time cells and
+repair just the agents involved:
+
+    remove      -- drop the agent's reservations; nobody else is replanned
+    goal change -- re-route the agent with a space-time A* around everyone
+                   else's reservations, searching a small box around its
+                   position and goal first and widening it on failure. If
+                   no such route exists, the agent takes its unconstrained
+                   shortest route and each agent that route newly conflicts
+                   with is re-routed in turn. ``None`` tells the caller to
+                   fall back to a full replan.
+
+Moves follow the solver's model: wait, rotate 90 degrees in place, or one
+cell forward in the current heading. Conflicts are per cell, ignoring
+orientation, as in ``validate.py``: two agents in one cell at one timestep
+(vertex) or two agents exchanging cells (swap). An agent keeps its last
+cell once its path ends.
+
+Paths are lists of (row, col, orientation) states indexed by the plan's own
+timesteps. Repaired paths keep every state before the repair timestep, so
+the rest of the fleet and the current frame are untouched.
+"""
+
+import heapq
+import itertools
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from validate import HEADING_STEPS
+
+Box = Tuple[int, int, int, int]  # (row0, col0, row1, col1), inclusive
+
+# Box margins (cells around start and goal) tried before searching the whole map
+REPAIR_MARGINS = (8, 32)
+
+# Cap on A* expansions per search, so a hopeless repair falls back quickly
+MAX_EXPANSIONS = 200000
+
+_STEPS = [tuple(step) for step in HEADING_STEPS.tolist()]
+
+
+def state_at(path, t: int) -> Tuple[int, int, int]:
+    """The (row, col, orientation) of ``path`` at timestep ``t``; orientation 0 if the path has none"""
+    entry = path[min(t, len(path) - 1)]
+    return (entry[0], entry[1], entry[2] if len(entry) > 2 else 0)
+
+
+def splice(path, t0: int, future) -> List[Tuple[int, int, int]]:
+    """Keep ``path`` before timestep ``t0`` (waiting at its end if it is shorter) and continue with ``future``"""
+    prefix = [state_at(path, t) for t in range(t0)] if path else []
+    return prefix + [tuple(state) for state in future]
+
+
+class ReservationWindow:
+    """Reservations inside one box from one timestep onwards, in the form the A* reads.
+
+    ``vertex`` maps ``t * num_cells + cell`` and ``edges`` maps
+    ``(t * num_cells + from) * num_cells + to`` to the agent holding it;
+    ``parked`` maps a cell to the first timestep an agent stays there for
+    good and ``busy_until`` to the last timestep any agent passes through.
+    After ``horizon`` only parked agents remain.
+    """
+
+    def __init__(self, ncols: int, num_cells: int, vertex=None, edges=None, parked=None, busy_until=None, horizon: int = 0):
+        self.ncols = ncols
+        self.num_cells = num_cells
+        self.vertex = {} if vertex is None else vertex
+        self.edges = {} if edges is None else edges
+        self.parked = {} if parked is None else parked
+        self.busy_until = {} if busy_until is None else busy_until
+        self.horizon = horizon
+
+    def last_busy(self, cell: int) -> int:
+        """Last timestep some agent passes through ``cell`` (-1 if none)"""
+        return self.busy_until.get(cell, -1)
+
+    def add_path(self, agent: int, path):
+        """Reserve ``path`` (timesteps from 0) directly, e.g. for prioritized planning in one window"""
+        n = self.num_cells
+        cells = [r * self.ncols + c for r, c, *_ in path]
+        for t, cell in enumerate(cells):
+            self.vertex[t * n + cell] = agent
+            self.busy_until[cell] = max(self.busy_until.get(cell, -1), t)
+            if t and cells[t - 1] != cell:
+                self.edges[((t - 1) * n + cells[t - 1]) * n + cell] = agent
+        self.parked[cells[-1]] = min(self.parked.get(cells[-1], len(cells) - 1), len(cells) - 1)
+        self.horizon = max(self.horizon, len(cells))
+
+
+class ReservationTable:
+    """Space-time cells reserved by every agent's path, keyed by agent id.
+
+    The plan it is built from is stored as one sorted array of
+    ``cell * horizon + t`` keys, so the reservations of any rectangle are a
+    ``searchsorted`` slice per row and building costs a single sort.
+    Changes afterwards are cheap: removing an agent masks its entries, and a
+    replaced path goes into a small per-cell overlay.
+    """
+
+    def __init__(self, paths: Dict[int, list], shape: Tuple[int, int]):
+        self.nrows, self.ncols = shape
+        self.num_cells = self.nrows * self.ncols
+        ids = [agent for agent, path in paths.items() if path]
+        lengths = np.array([len(paths[agent]) for agent in ids], dtype=np.int64)
+        self.horizon = int(lengths.max()) if ids else 1
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        if ids:
+            rc = np.concatenate([np.asarray(paths[agent], dtype=np.int64).reshape(len(paths[agent]), -1)[:, :2]
+                                 for agent in ids])
+            cells = rc[:, 0] * self.ncols + rc[:, 1]
+        else:
+            cells = np.zeros(0, dtype=np.int64)
+        times = np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)
+        keys = cells * self.horizon + times
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._agents = np.repeat(np.array(ids, dtype=np.int64), lengths)[order]
+        self._live = np.ones(len(keys), dtype=bool)
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))
+        self._entries = {agent: position[offsets[i]:offsets[i + 1]] for i, agent in enumerate(ids)}
+
+        self._overlay = {}        # agent -> cells of a path set after construction
+        self._overlay_cells = {}  # cell -> {agent: [timesteps]}
+        self._parked_at = {}      # agent -> its final cell
+        self.parked = {}          # cell -> {agent: first timestep parked}
+        for agent in ids:
+            self._park(agent, paths[agent])
+
+    def _park(self, agent: int, path):
+        cell = path[-1][0] * self.ncols + path[-1][1]
+        self._parked_at[agent] = cell
+        self.parked.setdefault(cell, {})[agent] = len(path) - 1
+
+    def remove(self, agent: int):
+        """Free every reservation of ``agent``"""
+        entries = self._entries.pop(agent, None)
+        if entries is not None:
+            self._live[entries] = False
+        for cell in set(self._overlay.pop(agent, ())):
+            self._overlay_cells[cell].pop(agent, None)
+        cell = self._parked_at.pop(agent, None)
+        if cell is not None:
+            del self.parked[cell][agent]
+            if not self.parked[cell]:
+                del self.parked[cell]
+
+    def set_path(self, agent: int, path):
+        """Replace the reservations of ``agent`` with ``path``"""
+        self.remove(agent)
+        if not path:
+            return
+        cells = [r * self.ncols + c for r, c, *_ in path]
+        self._overlay[agent] = cells
+        for t, cell in enumerate(cells):
+            self._overlay_cells.setdefault(cell, {}).setdefault(agent, []).append(t)
+        self._park(agent, path)
+
+    def occupancy(self, cell: int) -> Dict[int, List[int]]:
+        """Agents whose paths pass through ``cell``, by timestep (parked agents excluded)"""
+        lo, hi = np.searchsorted(self._keys, [cell * self.horizon, (cell + 1) * self.horizon])
+        live = self._live[lo:hi]
+        by_time = {}
+        for t, agent in zip((self._keys[lo:hi][live] % self.horizon).tolist(), self._agents[lo:hi][live].tolist()):
+            by_time.setdefault(t, []).append(agent)
+        for agent, times in self._overlay_cells.get(cell, {}).items():
+            for t in times:
+                by_time.setdefault(t, []).append(agent)
+        return by_time
+
+    def window(self, box: Box, t0: int) -> ReservationWindow:
+        """Collect the reservations inside ``box`` at timesteps >= ``t0``"""
+        r0, c0, r1, c1 = box
+        rows = np.arange(r0, r1 + 1, dtype=np.int64)
+        lo = np.searchsorted(self._keys, (rows * self.ncols + c0) * self.horizon)
+        hi = np.searchsorted(self._keys, (rows * self.ncols + c1 + 1) * self.horizon)
+        idx = np.concatenate([np.arange(a, b) for a, b in zip(lo.tolist(), hi.tolist())] + [np.zeros(0, dtype=np.int64)])
+        idx = idx[self._live[idx]]
+        cells, times = np.divmod(self._keys[idx], self.horizon)
+        agents = self._agents[idx]
+
+        extra = [(cell, t, agent) for cell, by_agent in self._overlay_cells.items()
+                 if r0 <= cell // self.ncols <= r1 and c0 <= cell % self.ncols <= c1
+                 for agent, ts in by_agent.items() for t in ts]
+        if extra:
+            extra = np.array(extra, dtype=np.int64)
+            cells = np.concatenate((cells, extra[:, 0]))
+            times = np.concatenate((times, extra[:, 1]))
+            agents = np.concatenate((agents, extra[:, 2]))
+        keep = times >= t0
+        cells, times, agents = cells[keep], times[keep], agents[keep]
+
+        n = self.num_cells
+        vertex = dict(zip((times * n + cells).tolist(), agents.tolist()))
+        # Consecutive entries of one agent that change cell are moves another agent must not swap with
+        order = np.lexsort((times, agents))
+        a, t, c = agents[order], times[order], cells[order]
+        move = (a[1:] == a[:-1]) & (t[1:] == t[:-1] + 1) & (c[1:] != c[:-1])
+        edges = dict(zip(((t[:-1][move] * n + c[:-1][move]) * n + c[1:][move]).tolist(), a[:-1][move].tolist()))
+        parked = {cell: min(by_agent.values()) for cell, by_agent in self.parked.items()
+                  if r0 <= cell // self.ncols <= r1 and c0 <= cell % self.ncols <= c1}
+        # Latest timestep per cell: the last entry of each cell once sorted by (cell, time)
+        order = np.lexsort((times, cells))
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = cells[order][1:] != cells[order][:-1]
+        busy_until = dict(zip(cells[order][last].tolist(), times[order][last].tolist()))
+        horizon = int(times.max()) + 1 if len(times) else t0
+        return ReservationWindow(self.ncols, n, vertex, edges, parked, busy_until, horizon)
+
+    def conflicts(self, agent: int, path, t0: int) -> List[int]:
+        """Other agents that ``path`` collides with from timestep ``t0``, in order of first conflict"""
+        occupancy = {}
+
+        def occupants(cell):
+            if cell not in occupancy:
+                occupancy[cell] = self.occupancy(cell)
+            return occupancy[cell]
+
+        cells = [r * self.ncols + c for r, c, *_ in path]
+        found = []
+        for t in range(t0, len(cells)):
+            cell = cells[t]
+            hits = list(occupants(cell).get(t, []))
+            hits += [other for other, since in self.parked.get(cell, {}).items() if since <= t]
+            if t + 1 < len(cells) and cells[t + 1] != cell:
+                # Swap: someone at the next cell now moves into this cell
+                hits += [other for other in occupants(cells[t + 1]).get(t, []) if other in occupants(cell).get(t + 1, [])]
+            if t == len(cells) - 1:
+                # Once parked, anyone passing through later collides
+                hits += [other for later, others in occupants(cell).items() if later > t for other in others]
+            found += [other for other in hits if other != agent and other not in found]
+        return found
+
+
+def _distances(grid: np.ndarray, goal: Tuple[int, int], box: Box) -> List[int]:
+    """Cell distances to ``goal`` over free cells inside ``box`` as a flat list; -1 where unreachable"""
+    r0, c0, r1, c1 = box
+    free = ~grid[r0:r1 + 1, c0:c1 + 1]
+    dist = np.full(free.shape, -1, dtype=np.int64)
+    frontier = np.zeros_like(free)
+    frontier[goal[0] - r0, goal[1] - c0] = free[goal[0] - r0, goal[1] - c0]
+    d = 0
+    # Wavefront BFS: one whole-array dilation per distance
+    while frontier.any():
+        dist[frontier] = d
+        grown = frontier.copy()
+        grown[1:] |= frontier[:-1]
+        grown[:-1] |= frontier[1:]
+        grown[:, 1:] |= frontier[:, :-1]
+        grown[:, :-1] |= frontier[:, 1:]
+        frontier = grown & free & (dist < 0)
+        d += 1
+    full = np.full(grid.shape, -1, dtype=np.int64)
+    full[r0:r1 + 1, c0:c1 + 1] = dist
+    return full.ravel().tolist()
+
+
+def plan_path(grid: np.ndarray, start, goal: Tuple[int, int], t0: int,
+              reservations: Optional[ReservationWindow] = None, box: Optional[Box] = None,
+              max_expansions: int = MAX_EXPANSIONS) -> Optional[List[Tuple[int, int, int]]]:
+    """Space-time A* from state ``start`` at timestep ``t0`` to cell ``goal``.
+
+    Returns the states from ``t0`` until the agent reaches ``goal`` and can
+    stay there, or None. The search stays inside ``box`` (default: the whole
+    map) and avoids ``reservations`` if given.
+    """
+    nrows, ncols = grid.shape
+    n = nrows * ncols
+    box = box or (0, 0, nrows - 1, ncols - 1)
+    h = _distances(grid, goal, box)
+    start_cell = start[0] * ncols + start[1]
+    goal_cell = goal[0] * ncols + goal[1]
+    if h[start_cell] < 0:
+        return None
+    if reservations is None:
+        vertex, edges, parked, horizon, goal_free = {}, {}, {}, t0, t0
+    else:
+        vertex, edges, parked, horizon = reservations.vertex, reservations.edges, reservations.parked, reservations.horizon
+        goal_free = reservations.last_busy(goal_cell) + 1
+        if goal_cell in parked:
+            return None  # Another agent ends its path there
+
+    start_state = (start_cell, start[2], t0)
+    counter = itertools.count()
+    heap = [(h[start_cell], -t0, next(counter), start_state)]
+    parents = {start_state: None}
+    closed = set()
+    while heap:
+        _, _, _, state = heapq.heappop(heap)
+        cell, o, t = state
+        if cell == goal_cell and t >= goal_free:
+            path = []
+            while state is not None:
+                path.append((state[0] // ncols, state[0] % ncols, state[1]))
+                state = parents[state]
+            return path[::-1]
+        # Past the horizon nothing moves any more, so states differ only in time
+        key = (cell, o, t if t < horizon else horizon)
+        if key in closed:
+            continue
+        closed.add(key)
+        if len(closed) > max_expansions:
+            return None
+
+        nt = t + 1
+        capped = nt if nt < horizon else horizon
+        r, c = divmod(cell, ncols)
+        dr, dc = _STEPS[o]
+        successors = [(cell, o), (cell, (o + 1) % 4), (cell, (o + 3) % 4)]
+        if 0 <= r + dr < nrows and 0 <= c + dc < ncols:
+            successors.append((cell + dr * ncols + dc, o))
+        for next_cell, next_o in successors:
+            if h[next_cell] < 0 or nt * n + next_cell in vertex:
+                continue
+            if parked.get(next_cell, nt + 1) <= nt:
+                continue
+            if next_cell != cell and (t * n + next_cell) * n + cell in edges:
+                continue
+            if (next_cell, next_o, capped) in closed:
+                continue
+            next_state = (next_cell, next_o, nt)
+            if next_state not in parents:
+                parents[next_state] = state
+                heapq.heappush(heap, (nt - t0 + h[next_cell], -nt, next(counter), next_state))
+    return None
+
+
+def _plan_local(table: ReservationTable, grid: np.ndarray, start, goal, t0: int, margins, max_expansions: int):
+    """Plan around the table's reservations in growing boxes, ending with the whole map"""
+    nrows, ncols = grid.shape
+    for margin in tuple(margins) + (max(nrows, ncols),):
+        box = (max(0, min(start[0], goal[0]) - margin), max(0, min(start[1], goal[1]) - margin),
+               min(nrows - 1, max(start[0], goal[0]) + margin), min(ncols - 1, max(start[1], goal[1]) + margin))
+        future = plan_path(grid, start, goal, t0, table.window(box, t0), box, max_expansions)
+        if future is not None or box == (0, 0, nrows - 1, ncols - 1):
+            return future
+    return None
+
+
+def repair_goal_change(table: ReservationTable, grid: np.ndarray, paths: Dict[int, list], agent: int,
+                       goal: Tuple[int, int], t0: int, margins=REPAIR_MARGINS,
+                       max_expansions: int = MAX_EXPANSIONS) -> Optional[Dict[int, list]]:
+    """Send ``agent`` to ``goal`` from timestep ``t0``, repairing only the agents it disturbs.
+
+    ``paths`` maps agent ids to their current paths and is not modified;
+    agents other than ``agent`` keep the goal their path ends at. Returns
+    the new path of every agent that changed, with ``table`` updated to
+    match, or None when a full replan is needed (the table is then stale).
+    """
+    table.remove(agent)
+    start = state_at(paths[agent], t0)
+    future = _plan_local(table, grid, start, goal, t0, margins, max_expansions)
+    if future is not None:
+        repaired = {agent: splice(paths[agent], t0, future)}
+        table.set_path(agent, repaired[agent])
+        return repaired
+
+    # Boxed in: take the unconstrained route and move whoever is in the way
+    future = plan_path(grid, start, goal, t0, max_expansions=max_expansions)
+    if future is None:
+        return None
+    repaired = {agent: splice(paths[agent], t0, future)}
+    table.set_path(agent, repaired[agent])
+    for other in table.conflicts(agent, repaired[agent], t0):
+        table.remove(other)
+        other_start = state_at(paths[other], t0)
+        other_goal = tuple(paths[other][-1][:2])
+        other_future = _plan_local(table, grid, other_start, other_goal, t0, margins, max_expansions)
+        if other_future is None:
+            return None
+        repaired[other] = splice(paths[other], t0, other_future)
+        table.set_path(other, repaired[other])
+    return repaired
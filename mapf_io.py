@@ -0,0 +1,197 @@
+"""Reading and writing map, scenario and path files without a display.
+
+These helpers are shared by the visualizer and the offline tools. Paths
+follow the format written by ``LNS::writePathsToFile`` and the visualizer:
+one ``Agent <id>: (row,col,orientation) -> ...`` line per agent.
+"""
+
+import itertools
+import os
+import re
+import subprocess
+import numpy as np
+from typing import Iterator, List, Optional, Set, Tuple
+
+# Turns "Agent 3:(1,2,0)->(1,3,1)->" into "3 1 2 0 1 3 1"
+_PATH_PUNCTUATION = str.maketrans({ch: ' ' for ch in '(),->'})
+
+
+def load_grid(map_filename: str) -> np.ndarray:
+    """Load a map as a boolean (nrows, ncols) array, True where the cell is blocked.
+
+    As in ``Instance::loadMap``, every character other than '.' is an
+    obstacle, so both '@' and 'T' maps are handled.
+    """
+    with open(map_filename, 'r') as f:
+        lines = f.readlines()
+    nrows = ncols = 0
+    map_start = len(lines)
+    for i, line in enumerate(lines):
+        if line.startswith('height'):
+            nrows = int(line.strip().split()[1])
+        elif line.startswith('width'):
+            ncols = int(line.strip().split()[1])
+        elif line.strip() == 'map':
+            map_start = i + 1
+            break
+    grid = np.ones((nrows, ncols), dtype=bool)
+    for r, line in enumerate(lines[map_start:map_start + nrows]):
+        row = np.frombuffer(line.strip()[:ncols].encode(), dtype=np.uint8)
+        grid[r, :len(row)] = row != ord('.')
+    return grid
+
+
+def write_map_file(map_filename: str, grid: np.ndarray):
+    """Write a boolean blocked-cell array as an octile map with '@' obstacles"""
+    rows = np.where(grid, ord('@'), ord('.')).astype(np.uint8)
+    with open(map_filename, 'w') as f:
+        f.write(f"type octile\nheight {grid.shape[0]}\nwidth {grid.shape[1]}\nmap\n")
+        for row in rows:
+            f.write(row.tobytes().decode() + '\n')
+
+
+def parse_map(map_filename: str) -> Tuple[Set[Tuple[int, int]], int, int]:
+    """Parse map file to get obstacles and dimensions"""
+    grid = load_grid(map_filename)
+    obstacles = set(zip(*(idx.tolist() for idx in np.nonzero(grid))))
+    return obstacles, grid.shape[0], grid.shape[1]
+
+
+def load_scen_array(scen_file: str, agent_num: Optional[int] = None) -> np.ndarray:
+    """Read a ``version 1`` scenario as an int array of (start_row, start_col, goal_row, goal_col)"""
+    rows = []
+    with open(scen_file, 'r') as f:
+        next(f, None)  # Skip version line
+        for line in f:
+            if agent_num is not None and len(rows) >= agent_num:
+                break
+            parts = line.strip().split('\t')
+            if len(parts) >= 8:
+                start_col, start_row, goal_col, goal_row = (int(x) for x in parts[4:8])
+                rows.append((start_row, start_col, goal_row, goal_col))
+    return np.array(rows, dtype=np.int32).reshape(-1, 4)
+
+
+def parse_scen_file(scen_file: str, agent_num: int, nrows: int, ncols: int) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """Parse scenario file to get start and goal positions, skipping agents outside the map"""
+    starts = []
+    goals = []
+    for idx, (start_row, start_col, goal_row, goal_col) in enumerate(load_scen_array(scen_file, agent_num).tolist()):
+        # Validation: check if within map bounds
+        if not (0 <= start_row < nrows and 0 <= start_col < ncols and 0 <= goal_row < nrows and 0 <= goal_col < ncols):
+            print(f"Warning: Agent {idx} start or goal out of bounds and will be skipped. Start=({start_row},{start_col}), Goal=({goal_row},{goal_col}), Map=({nrows},{ncols})")
+            continue
+        starts.append((start_row, start_col))
+        goals.append((goal_row, goal_col))
+    return starts, goals
+
+
+def write_scen_file(scen_path: str, map_file: str, nrows: int, ncols: int,
+                    starts: List[Tuple[int, int]], goals: List[Tuple[int, int]]):
+    """Write a ``version 1`` scenario file"""
+    with open(scen_path, 'w') as f:
+        f.write('version 1\n')
+        for i, (s, g) in enumerate(zip(starts, goals)):
+            f.write(f"{i}\t{map_file}\t{ncols}\t{nrows}\t{s[1]}\t{s[0]}\t{g[1]}\t{g[0]}\t0\n")
+
+
+def parse_paths_file(filename: str) -> List[List[Tuple[int, ...]]]:
+    """Parse paths from output file, including orientation if present"""
+    paths = []
+    with open(filename, 'r') as f:
+        for line in f:
+            m = re.match(r'Agent (\d+):(.*)', line.strip())
+            if not m:
+                continue
+            path_str = m.group(2)
+            # Try to match (row,col,orientation)
+            coords = re.findall(r'\((\d+),(\d+),(\d+)\)', path_str)
+            if coords:
+                path = [(int(r), int(c), int(o)) for r, c, o in coords]
+            else:
+                # Fallback: match (row,col)
+                coords = re.findall(r'\((\d+),(\d+)\)', path_str)
+                path = [(int(r), int(c)) for r, c in coords]
+            paths.append(path)
+    return paths
+
+
+def iter_paths(filename: str) -> Iterator[Tuple[int, np.ndarray]]:
+    """Stream (agent_id, states) pairs from a paths file, one line at a time.
+
+    ``states`` is an int array of shape (path_length, 3) for (row, col,
+    orientation) paths or (path_length, 2) for paths without orientation.
+    Much faster than ``parse_paths_file`` on large solutions because each
+    line is converted with a single NumPy call instead of a regex per state.
+    """
+    with open(filename, 'r') as f:
+        for line in f:
+            if not line.startswith('Agent'):
+                continue
+            head, _, body = line.partition(':')
+            num_states = body.count('(')
+            values = np.fromstring(body.translate(_PATH_PUNCTUATION), dtype=np.int32, sep=' ')
+            width = len(values) // num_states if num_states else 3
+            yield int(head.split()[1]), values.reshape(-1, width)
+
+
+def paths_to_array(paths) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack paths into a (num_agents, makespan, 3) int32 array plus per-agent lengths.
+
+    Agents stay at their last state after finishing, matching how the
+    visualizer and the solver treat arrived agents. Paths without
+    orientation get orientation 0.
+    """
+    lengths = np.array([len(p) for p in paths], dtype=np.int32)
+    makespan = int(lengths.max()) if len(paths) and lengths.max() > 0 else 1
+    states = np.zeros((len(paths), makespan, 3), dtype=np.int32)
+    nonempty = np.flatnonzero(lengths)
+    if not len(nonempty):
+        return states, lengths
+    # Agents are packed in one pass per state width: all values are read with a single
+    # fromiter, then gathered into (agent, timestep) slots, repeating each agent's last state
+    timesteps = np.arange(makespan)
+    widths = np.array([len(paths[i][0]) for i in nonempty])
+    for width in np.unique(widths).tolist():
+        agents = nonempty[widths == width]
+        group_lengths = lengths[agents]
+        values = np.fromiter(itertools.chain.from_iterable(itertools.chain.from_iterable(paths[i] for i in agents)),
+                             dtype=np.int32, count=int(group_lengths.sum()) * width).reshape(-1, width)
+        offsets = np.cumsum(group_lengths) - group_lengths
+        index = offsets[:, None] + np.minimum(timesteps, group_lengths[:, None] - 1)
+        states[agents, :, :min(width, 3)] = values[index, :3]
+    return states, lengths
+
+
+def format_path(path) -> str:
+    def format_entry(entry):
+        if len(entry) == 3:
+            return f"({entry[0]},{entry[1]},{entry[2]})"
+        else:
+            return f"({entry[0]},{entry[1]})"
+    return " -> ".join(format_entry(e) for e in path)
+
+
+def write_paths_file(filename: str, paths):
+    """Write paths in the format read by ``parse_paths_file``"""
+    with open(filename, 'w') as f:
+        for i, path in enumerate(paths):
+            f.write(f"Agent {i}: {format_path(path)}\n")
+
+
+def run_lns(map_file: str, scen_file: str, agent_num: int, out_path: str,
+            cutoff_time: float = 30, lns_exec: str = './lns') -> List[List[Tuple[int, ...]]]:
+    """Run the C++ solver on a scenario file and return the parsed paths.
+
+    Raises ``subprocess.TimeoutExpired``, ``subprocess.CalledProcessError``
+    or ``FileNotFoundError`` like ``subprocess.run`` does.
+    """
+    cmd = [
+        lns_exec, '--map', map_file, '--agents', scen_file,
+        '--agentNum', str(agent_num), '--outputPaths', out_path,
+        '--cutoffTime', str(cutoff_time)
+    ]
+    subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=cutoff_time + 5)
+    if not os.path.exists(out_path):
+        raise FileNotFoundError(out_path)
+    return parse_paths_file(out_path)
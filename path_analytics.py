@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Congestion and utilization analytics over planned (row, col, orientation) paths.
+
+Every statistic is computed with whole-array NumPy operations over the packed
+(num_agents, makespan, 3) path array: per-cell counts are a single
+``np.bincount`` over linear cell indices, and per-timestep curves are column
+sums of boolean masks. Each agent only counts up to the end of its own path;
+the time it spends parked at its goal afterwards is not congestion.
+
+Usage:
+    python3 path_analytics.py <map_file> <paths_file> [--out analytics.npz]
+"""
+
+import argparse
+import numpy as np
+
+import mapf_io
+
+HEATMAP_METRICS = ('visits', 'waits', 'rotations')
+
+
+class PathAnalytics:
+    """Per-cell and per-timestep statistics of a plan.
+
+    Per-cell arrays have shape (nrows, ncols):
+        visits    -- agent-timesteps spent in the cell
+        waits     -- steps where an agent kept both its cell and orientation (t -> t+1)
+        rotations -- steps where an agent turned in place in the cell
+
+    Per-timestep arrays have one entry per timestep (the transition
+    arrays describe steps from t to t+1, so they are one shorter):
+        active   -- agents that have not yet reached the end of their path
+        moving, waiting, rotating -- agents taking each kind of step
+    """
+
+    def __init__(self, visits, waits, rotations, active, moving, waiting, rotating):
+        self.visits = visits
+        self.waits = waits
+        self.rotations = rotations
+        self.active = active
+        self.moving = moving
+        self.waiting = waiting
+        self.rotating = rotating
+
+    def as_dict(self):
+        return {
+            'visits': self.visits, 'waits': self.waits, 'rotations': self.rotations,
+            'active': self.active, 'moving': self.moving, 'waiting': self.waiting, 'rotating': self.rotating,
+        }
+
+    def save(self, filename: str):
+        """Export all arrays to a compressed ``.npz`` file"""
+        np.savez_compressed(filename, **self.as_dict())
+
+
+def compute_analytics(states: np.ndarray, lengths: np.ndarray, nrows: int, ncols: int) -> PathAnalytics:
+    """Compute analytics from the arrays returned by ``mapf_io.paths_to_array``"""
+    num_agents, makespan, _ = states.shape
+    num_cells = nrows * ncols
+    cells = states[:, :, 0] * ncols + states[:, :, 1]
+    orientations = states[:, :, 2]
+    timesteps = np.arange(makespan)
+    on_path = timesteps[None, :] < lengths[:, None]
+    in_transition = timesteps[None, :-1] < (lengths[:, None] - 1)
+
+    same_cell = cells[:, :-1] == cells[:, 1:]
+    same_orientation = orientations[:, :-1] == orientations[:, 1:]
+    wait = same_cell & same_orientation & in_transition
+    rotate = same_cell & ~same_orientation & in_transition
+    move = ~same_cell & in_transition
+
+    from_cells = cells[:, :-1]
+    return PathAnalytics(
+        visits=np.bincount(cells[on_path], minlength=num_cells).reshape(nrows, ncols),
+        waits=np.bincount(from_cells[wait], minlength=num_cells).reshape(nrows, ncols),
+        rotations=np.bincount(from_cells[rotate], minlength=num_cells).reshape(nrows, ncols),
+        active=on_path.sum(axis=0),
+        moving=move.sum(axis=0),
+        waiting=wait.sum(axis=0),
+        rotating=rotate.sum(axis=0),
+    )
+
+
+def analyze_paths(paths, nrows: int, ncols: int) -> PathAnalytics:
+    """Compute analytics directly from lists of path entries"""
+    states, lengths = mapf_io.paths_to_array(paths)
+    return compute_analytics(states, lengths, nrows, ncols)
+
+
+def heatmap_rgb(values: np.ndarray, background=(255, 255, 255)) -> np.ndarray:
+    """Map per-cell counts to a (nrows, ncols, 3) uint8 image, pale yellow to dark red.
+
+    A square-root scale keeps a few hot spots from washing out the rest of
+    the map. Cells with a zero count keep the background color.
+    """
+    rgb = np.empty(values.shape + (3,), dtype=np.uint8)
+    rgb[:] = background
+    peak = values.max() if values.size else 0
+    if peak > 0:
+        level = np.sqrt(values / peak)
+        hot = values > 0
+        rgb[..., 0][hot] = (255 - 75 * level[hot]).astype(np.uint8)
+        rgb[..., 1][hot] = (240 * (1 - level[hot])).astype(np.uint8)
+        rgb[..., 2][hot] = (160 * (1 - level[hot]) ** 2).astype(np.uint8)
+    return rgb
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Congestion and utilization analytics for a MAPF plan")
+    parser.add_argument('map_file')
+    parser.add_argument('paths_file')
+    parser.add_argument('--out', help="Write all arrays to this .npz file")
+    parser.add_argument('--top', type=int, default=10, help="Number of busiest cells to list")
+    args = parser.parse_args()
+
+    grid = mapf_io.load_grid(args.map_file)
+    paths = [states for _, states in mapf_io.iter_paths(args.paths_file)]
+    analytics = analyze_paths(paths, *grid.shape)
+
+    print(f"Agents: {len(paths)}, makespan: {len(analytics.active)}, peak concurrency: {analytics.active.max(initial=0)}")
+    print(f"Steps: {analytics.moving.sum()} moves, {analytics.waiting.sum()} waits, {analytics.rotating.sum()} rotations")
+    for metric in HEATMAP_METRICS:
+        values = getattr(analytics, metric)
+        top = np.argsort(values, axis=None)[::-1][:args.top]
+        cells = ", ".join(f"({r},{c}):{values[r, c]}" for r, c in zip(*np.unravel_index(top, values.shape)) if values[r, c] > 0)
+        print(f"Busiest cells by {metric}: {cells}")
+    if args.out:
+        analytics.save(args.out)
+        print(f"Saved analytics to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,606 @@
+#!/usr/bin/env python3
+"""Local planning server hosting many independent MAPF sessions.
+
+Each session has its own map, agents, plan and simulation clock. Replans run
+``./lns`` in a bounded number of worker processes. Pending jobs are ordered
+by session priority (lower number runs first), and a new replan request for
+a session supersedes the older one: a queued job is dropped before it starts,
+and a job already running is killed along with its solver. Closing a session
+kills its job the same way. While a session waits for a replan its clock is
+held, just as the visualizer's loop is blocked during ``replan_all_paths``.
+
+Removing an agent and changing an agent's goal do not go through the
+scheduler: they are applied at once with ``local_repair``, which only
+touches the agents involved. A goal change falls back to a queued full replan if the local
+repair fails or a full replan is already pending.
+
+The API is JSON over HTTP on localhost:
+
+    GET    /sessions                       list sessions
+    POST   /sessions                       {"map_file", "scen_file"?, "agent_num"?, "priority"?, "speed"?}
+    GET    /sessions/<id>[?since_version=V] session state; paths are omitted if the plan is unchanged since V
+    DELETE /sessions/<id>                  close a session
+    POST   /sessions/<id>/agents           {"start": [row, col], "goal": [row, col]} -- add an agent and replan
+    DELETE /sessions/<id>/agents/<aid>     remove an agent; nobody else is replanned
+    POST   /sessions/<id>/agents/<aid>/goal {"goal": [row, col]} -- redirect an agent with a local repair
+    POST   /sessions/<id>/replan           {"priority"?} -- replan every agent from its current position
+    POST   /sessions/<id>/clock            {"speed"?, "paused"?}
+
+Usage:
+    python3 planning_server.py [--host 127.0.0.1] [--port 8765] [--workers N]
+
+The visualizer attaches to a session as a read-only client with:
+    python3 dynamic_visualizer.py --attach http://127.0.0.1:8765/sessions/0
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import multiprocessing as mp
+import os
+import re
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import local_repair
+import mapf_io
+from sim_clock import SimulationClock
+
+
+def plan_paths(map_file: str, starts: List[Tuple[int, ...]], goals: List[Tuple[int, int]], cutoff_time: float = 30):
+    """Run the C++ pathfinder for one replan job (executed in a worker process)"""
+    if not starts:
+        return []
+    nrows, ncols = mapf_io.load_grid(map_file).shape
+    with tempfile.TemporaryDirectory() as tmpdir:
+        scen_path = os.path.join(tmpdir, 'temp.scen')
+        mapf_io.write_scen_file(scen_path, map_file, nrows, ncols, starts, goals)
+        return mapf_io.run_lns(map_file, scen_path, len(starts), os.path.join(tmpdir, 'temp_paths.txt'), cutoff_time)
+
+
+def _run_job(job_fn, args, conn):
+    """Entry point of one replan worker process.
+
+    The worker leads its own process group so that killing the group also
+    kills a solver it has started.
+    """
+    os.setpgrp()
+    try:
+        result = (job_fn(*args), None)
+    except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError) as e:
+        result = (None, f"Pathfinding error: {e}")
+    except Exception as e:
+        result = (None, f"Replan job failed: {e}")
+    conn.send(result)
+    conn.close()
+
+
+class SessionError(Exception):
+    """A request that cannot be applied to a session; reported to the client as 400"""
+
+
+class Session:
+    """One independent fleet: map, agents, current plan and simulation clock"""
+
+    def __init__(self, session_id: int, map_file: str, priority: int = 0, speed: float = 1.0):
+        self.id = session_id
+        self.map_file = map_file
+        self.grid = mapf_io.load_grid(map_file)
+        self.nrows, self.ncols = self.grid.shape
+        self.priority = priority
+        self.lock = threading.RLock()
+
+        self.agents = []  # List of (start, goal, agent_id)
+        self.paths = []   # One path per agent, aligned with self.agents
+        self.next_agent_id = 0
+        self.version = 0  # Bumped whenever self.paths is replaced
+        self.status = 'idle'  # idle | planning | failed
+        self.error = None
+        self.latest_request = None  # Replan request id whose result will be accepted
+        self.reservations = None  # local_repair.ReservationTable, rebuilt lazily after every full replan
+
+        # Sessions are not rendered, so elapsed time is never clamped
+        self.clock = SimulationClock(speed=speed, max_frame_time=float('inf'))
+        self.paused = False
+        self.frame = 0
+        self.makespan = 1
+        self.last_tick = time.monotonic()
+
+    def advance(self):
+        """Bring the simulation clock up to the current wall time"""
+        now = time.monotonic()
+        dt, self.last_tick = now - self.last_tick, now
+        if self.paused or self.status == 'planning':
+            return
+        self.frame = min(self.frame + self.clock.advance(dt), self.makespan - 1)
+
+    def current_state(self, index: int):
+        path = self.paths[index] if index < len(self.paths) else None
+        if path:
+            return path[min(self.frame, len(path) - 1)]
+        return self.agents[index][0]
+
+    def occupied_cells(self):
+        """Map every agent's current cell and goal cell to the agent's id"""
+        occupied = {}
+        for i, (_, goal, agent_id) in enumerate(self.agents):
+            occupied[tuple(self.current_state(i)[:2])] = agent_id
+            occupied[tuple(goal)] = agent_id
+        return occupied
+
+    def add_agent(self, start: Tuple[int, int], goal: Tuple[int, int], occupied: Optional[dict] = None) -> int:
+        """Add an agent (the caller schedules the replan) and return its id.
+
+        Pass the result of ``occupied_cells`` as ``occupied`` to add a batch
+        of agents without rescanning the fleet for each one; it is updated
+        in place.
+        """
+        for cell in (start, goal):
+            if not (0 <= cell[0] < self.nrows and 0 <= cell[1] < self.ncols):
+                raise SessionError(f"Cell {cell} is outside the map")
+            if self.grid[cell[0], cell[1]]:
+                raise SessionError(f"Cannot place agent on obstacle {cell}")
+        if occupied is None:
+            occupied = self.occupied_cells()
+        for cell in (start, goal):
+            if cell in occupied:
+                raise SessionError(f"Position already occupied by agent {occupied[cell]}")
+        agent_id = self.next_agent_id
+        self.next_agent_id += 1
+        occupied[start] = occupied[goal] = agent_id
+        self.agents.append((start, goal, agent_id))
+        self.paths.append([start])  # Temporary path until replanning
+        self.reservations = None
+        return agent_id
+
+    def _index(self, agent_id: int) -> int:
+        for i, (_, _, other_id) in enumerate(self.agents):
+            if other_id == agent_id:
+                return i
+        raise SessionError(f"Unknown agent {agent_id}")
+
+    def _reservation_table(self) -> local_repair.ReservationTable:
+        if self.reservations is None:
+            self.reservations = local_repair.ReservationTable(
+                {agent_id: path for (_, _, agent_id), path in zip(self.agents, self.paths)}, self.grid.shape)
+        return self.reservations
+
+    def _paths_changed(self):
+        self.makespan = max((len(p) for p in self.paths), default=1) or 1
+        self.frame = min(self.frame, self.makespan - 1)
+        self.version += 1
+
+    def remove_agent(self, agent_id: int):
+        """Remove an agent and free its reservations; no other agent is replanned"""
+        index = self._index(agent_id)
+        self._reservation_table().remove(agent_id)
+        del self.agents[index]
+        del self.paths[index]
+        self._paths_changed()
+
+    def change_goal(self, agent_id: int, goal: Tuple[int, int]) -> Optional[List[int]]:
+        """Give an agent a new goal and repair the plan locally.
+
+        Returns the ids of the agents whose paths changed, or None if the
+        caller must schedule a full replan instead.
+        """
+        index = self._index(agent_id)
+        if not (0 <= goal[0] < self.nrows and 0 <= goal[1] < self.ncols):
+            raise SessionError(f"Cell {goal} is outside the map")
+        if self.grid[goal[0], goal[1]]:
+            raise SessionError(f"Cannot place goal on obstacle {goal}")
+        for other_start, other_goal, other_id in self.agents:
+            if other_id != agent_id and tuple(other_goal) == goal:
+                raise SessionError(f"Goal {goal} is already the goal of agent {other_id}")
+        start, _, _ = self.agents[index]
+        self.agents[index] = (start, goal, agent_id)
+        if self.status == 'planning':
+            return None  # The pending replan has the old goal; the caller supersedes it
+        paths = {other_id: path for (_, _, other_id), path in zip(self.agents, self.paths)}
+        repaired = local_repair.repair_goal_change(self._reservation_table(), self.grid, paths, agent_id, goal, self.frame)
+        if repaired is None:
+            self.reservations = None
+            return None
+        for i, (_, _, other_id) in enumerate(self.agents):
+            if other_id in repaired:
+                self.paths[i] = repaired[other_id]
+        self._paths_changed()
+        return sorted(repaired)
+
+    def replan_request(self):
+        """Starts and goals for replanning every agent from its current position"""
+        starts = [tuple(self.current_state(i)) for i in range(len(self.agents))]
+        goals = [goal for _, goal, _ in self.agents]
+        return starts, goals
+
+    def apply_plan(self, request_id: int, starts, paths: Optional[list], error: Optional[str] = None) -> bool:
+        """Install the result of a replan unless a newer request superseded it"""
+        if request_id != self.latest_request:
+            return False
+        self.latest_request = None
+        self.last_tick = time.monotonic()
+        if paths is None or len(paths) != len(self.agents):
+            self.status, self.error = 'failed', error or "Pathfinding failed, keeping existing paths"
+            return True
+        self.agents = [(tuple(starts[i][:2]), goal, agent_id) for i, (_, goal, agent_id) in enumerate(self.agents)]
+        self.paths = paths
+        self.reservations = None
+        self.makespan = max((len(p) for p in paths), default=1) or 1
+        self.frame = 0
+        self.clock.reset()
+        self.version += 1
+        self.status, self.error = 'idle', None
+        return True
+
+    def to_dict(self, include_paths: bool = True):
+        state = {
+            'id': self.id, 'map_file': self.map_file, 'nrows': self.nrows, 'ncols': self.ncols,
+            'timestep': self.frame, 'alpha': self.clock.alpha, 'makespan': self.makespan, 'speed': self.clock.speed,
+            'paused': self.paused, 'status': self.status, 'error': self.error,
+            'priority': self.priority, 'version': self.version,
+            'agents': [{'id': agent_id, 'start': list(start), 'goal': list(goal)} for start, goal, agent_id in self.agents],
+        }
+        if include_paths:
+            state['paths'] = [[list(entry) for entry in path] for path in self.paths]
+        return state
+
+
+class ReplanScheduler:
+    """Runs replan jobs in at most ``max_workers`` processes in per-session priority order.
+
+    Jobs are only started when a worker slot is free, so the queue order
+    (priority, then submission order) decides what runs next and a
+    superseded job can still be dropped before it starts. Every job gets a
+    fresh process, so a superseded job that is already running can be
+    killed instead of holding its slot until the solver's cutoff.
+    """
+
+    def __init__(self, max_workers: int = None, job_fn=plan_paths):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.job_fn = job_fn
+        self.context = mp.get_context('spawn')
+        self.queue = []  # Heap of (priority, request_id, session, args)
+        self.jobs = {}   # request_id -> (process, session) for running jobs
+        self.request_ids = itertools.count()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def submit(self, session: Session, priority: Optional[int] = None) -> int:
+        """Queue a full replan of ``session``, superseding any earlier request for it"""
+        with session.lock:
+            starts, goals = session.replan_request()
+            request_id = next(self.request_ids)
+            session.latest_request = request_id
+            session.status, session.error = 'planning', None
+        with self.cond:
+            priority = session.priority if priority is None else priority
+            heapq.heappush(self.queue, (priority, request_id, session, (session.map_file, starts, goals)))
+            self.cond.notify()
+        self.cancel_superseded(session)
+        return request_id
+
+    def cancel_superseded(self, session: Session):
+        """Kill running jobs of ``session`` whose results would be discarded"""
+        with self.cond:
+            stale = [process for request_id, (process, other) in self.jobs.items()
+                     if other is session and request_id != session.latest_request]
+        for process in stale:
+            self._kill(process)
+
+    @staticmethod
+    def _kill(process):
+        if process.exitcode is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            process.kill()  # Not yet in its own group, so it has not started a solver either
+
+    def _dispatch(self):
+        while True:
+            with self.cond:
+                while not self.closed and (not self.queue or len(self.jobs) >= self.max_workers):
+                    self.cond.wait()
+                if self.closed:
+                    return
+                _, request_id, session, args = heapq.heappop(self.queue)
+                if request_id != session.latest_request:
+                    continue  # Superseded while queued
+                receiver, sender = self.context.Pipe(duplex=False)
+                process = self.context.Process(target=_run_job, args=(self.job_fn, args, sender), daemon=True)
+                process.start()
+                sender.close()
+                self.jobs[request_id] = (process, session)
+            threading.Thread(target=self._finished, args=(process, receiver, session, request_id, args[1]),
+                             daemon=True).start()
+
+    def _finished(self, process, receiver, session: Session, request_id: int, starts):
+        try:
+            paths, error = receiver.recv()
+        except EOFError:
+            paths, error = None, "Replan job was killed"
+        receiver.close()
+        process.join()
+        with session.lock:
+            session.apply_plan(request_id, starts, paths, error)
+        with self.cond:
+            del self.jobs[request_id]
+            self.cond.notify()
+
+    def pending(self) -> int:
+        with self.cond:
+            return sum(1 for _, request_id, session, _ in self.queue if request_id == session.latest_request)
+
+    def running(self) -> int:
+        with self.cond:
+            return len(self.jobs)
+
+    def shutdown(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+            processes = [process for process, _ in self.jobs.values()]
+        for process in processes:
+            self._kill(process)
+
+
+class PlanningServer:
+    """Session registry plus the HTTP front end"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, max_workers: int = None, job_fn=plan_paths):
+        self.sessions = {}
+        self.session_ids = itertools.count()
+        self.lock = threading.Lock()
+        self.scheduler = ReplanScheduler(max_workers, job_fn)
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def create_session(self, map_file: str, scen_file: str = None, agent_num: int = 0,
+                       priority: int = 0, speed: float = 1.0) -> Session:
+        if not os.path.exists(map_file):
+            raise SessionError(f"Map file not found: {map_file}")
+        # Read both files before the session is registered, so a bad request leaves nothing behind
+        try:
+            session = Session(None, map_file, priority, speed)
+            if scen_file and agent_num > 0:
+                starts, goals = mapf_io.parse_scen_file(scen_file, agent_num, session.nrows, session.ncols)
+            else:
+                starts, goals = [], []
+        except OSError as e:
+            raise SessionError(f"Cannot read session files: {e}")
+        with session.lock:
+            occupied = session.occupied_cells()
+            for start, goal in zip(starts, goals):
+                try:
+                    session.add_agent(start, goal, occupied)
+                except SessionError as e:
+                    print(f"Skipping agent {start} -> {goal}: {e}")
+        with self.lock:
+            session.id = next(self.session_ids)
+            self.sessions[session.id] = session
+        if session.agents:
+            self.scheduler.submit(session)
+        return session
+
+    def get_session(self, session_id: int) -> Session:
+        with self.lock:
+            if session_id not in self.sessions:
+                raise KeyError(session_id)
+            return self.sessions[session_id]
+
+    def close_session(self, session_id: int):
+        with self.lock:
+            session = self.sessions.pop(session_id)
+        with session.lock:
+            session.latest_request = None  # Drop any queued replan
+        self.scheduler.cancel_superseded(session)  # and kill a running one
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.scheduler.shutdown()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            routes = [
+                ('GET', r'/sessions', 'list_sessions'),
+                ('POST', r'/sessions', 'create_session'),
+                ('GET', r'/sessions/(\d+)', 'get_session'),
+                ('DELETE', r'/sessions/(\d+)', 'delete_session'),
+                ('POST', r'/sessions/(\d+)/agents', 'add_agent'),
+                ('DELETE', r'/sessions/(\d+)/agents/(\d+)', 'remove_agent'),
+                ('POST', r'/sessions/(\d+)/agents/(\d+)/goal', 'change_goal'),
+                ('POST', r'/sessions/(\d+)/replan', 'replan'),
+                ('POST', r'/sessions/(\d+)/clock', 'set_clock'),
+            ]
+
+            def log_message(self, format, *args):
+                pass  # Keep polling clients from flooding the console
+
+            def _send(self, status: int, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+            def _route(self, method: str):
+                url = urlparse(self.path)
+                for route_method, pattern, name in self.routes:
+                    m = re.fullmatch(pattern, url.path.rstrip('/'))
+                    if route_method == method and m:
+                        ids = [int(g) for g in m.groups()]
+                        try:
+                            args = [server.get_session(ids[0])] + ids[1:] if ids else []
+                        except KeyError:
+                            self._send(404, {'error': 'Unknown session'})
+                            return
+                        try:
+                            self._send(*getattr(self, name)(*args, query=parse_qs(url.query)))
+                        except KeyError as e:
+                            self._send(400, {'error': f'Missing field {e}'})
+                        except (SessionError, ValueError, TypeError, IndexError) as e:
+                            self._send(400, {'error': str(e)})
+                        return
+                self._send(404, {'error': f'No route for {method} {url.path}'})
+
+            def do_GET(self):
+                self._route('GET')
+
+            def do_POST(self):
+                self._route('POST')
+
+            def do_DELETE(self):
+                self._route('DELETE')
+
+            def list_sessions(self, query):
+                with server.lock:
+                    sessions = list(server.sessions.values())
+                result = []
+                for session in sessions:
+                    with session.lock:
+                        session.advance()
+                        result.append(session.to_dict(include_paths=False))
+                return 200, {'sessions': result}
+
+            def create_session(self, query):
+                body = self._body()
+                session = server.create_session(body['map_file'], body.get('scen_file'), int(body.get('agent_num', 0)),
+                                                int(body.get('priority', 0)), float(body.get('speed', 1.0)))
+                return 201, {'id': session.id}
+
+            def get_session(self, session, query):
+                since = int(query['since_version'][0]) if 'since_version' in query else None
+                with session.lock:
+                    session.advance()
+                    return 200, session.to_dict(include_paths=since != session.version)
+
+            def delete_session(self, session, query):
+                server.close_session(session.id)
+                return 200, {'closed': session.id}
+
+            def add_agent(self, session, query):
+                body = self._body()
+                with session.lock:
+                    session.advance()
+                    agent_id = session.add_agent(tuple(body['start'][:2]), tuple(body['goal'][:2]))
+                request_id = server.scheduler.submit(session, body.get('priority'))
+                return 201, {'agent_id': agent_id, 'request_id': request_id}
+
+            def remove_agent(self, session, agent_id, query):
+                with session.lock:
+                    session.advance()
+                    session.remove_agent(agent_id)
+                    replanning = session.status == 'planning'
+                    version = session.version
+                if replanning:
+                    server.scheduler.submit(session)  # The pending replan still includes the removed agent
+                return 200, {'removed': agent_id, 'version': version}
+
+            def change_goal(self, session, agent_id, query):
+                body = self._body()
+                with session.lock:
+                    session.advance()
+                    repaired = session.change_goal(agent_id, tuple(body['goal'][:2]))
+                    version = session.version
+                if repaired is None:
+                    return 202, {'request_id': server.scheduler.submit(session, body.get('priority'))}
+                return 200, {'repaired': repaired, 'version': version}
+
+            def replan(self, session, query):
+                body = self._body()
+                with session.lock:
+                    session.advance()
+                return 202, {'request_id': server.scheduler.submit(session, body.get('priority'))}
+
+            def set_clock(self, session, query):
+                body = self._body()
+                with session.lock:
+                    session.advance()
+                    if 'speed' in body:
+                        session.clock.set_speed(float(body['speed']))
+                    if 'paused' in body:
+                        session.paused = bool(body['paused'])
+                    return 200, session.to_dict(include_paths=False)
+
+        return Handler
+
+
+class SessionClient:
+    """Minimal client for one session, e.g. ``SessionClient('http://127.0.0.1:8765/sessions/0')``"""
+
+    def __init__(self, session_url: str, timeout: float = 10):
+        self.session_url = session_url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str = '', body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.session_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def get_state(self, since_version: Optional[int] = None):
+        return self._request('GET', '' if since_version is None else f'?since_version={since_version}')
+
+    def add_agent(self, start, goal, priority: Optional[int] = None):
+        return self._request('POST', '/agents', {'start': list(start), 'goal': list(goal), 'priority': priority})
+
+    def remove_agent(self, agent_id: int):
+        return self._request('DELETE', f'/agents/{agent_id}')
+
+    def change_goal(self, agent_id: int, goal, priority: Optional[int] = None):
+        return self._request('POST', f'/agents/{agent_id}/goal', {'goal': list(goal), 'priority': priority})
+
+    def replan(self, priority: Optional[int] = None):
+        return self._request('POST', '/replan', {'priority': priority})
+
+    def set_clock(self, speed: Optional[float] = None, paused: Optional[bool] = None):
+        body = {k: v for k, v in (('speed', speed), ('paused', paused)) if v is not None}
+        return self._request('POST', '/clock', body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local multi-session MAPF planning server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None, help="Replan processes (default: all cores)")
+    args = parser.parse_args()
+
+    server = PlanningServer(args.host, args.port, args.workers)
+    print(f"Planning server listening on {server.url} with {server.scheduler.max_workers} replan workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
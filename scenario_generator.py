@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Generate random, solvable MAPF scenarios of any size on any map.
+
+Connected components of the free cells are labelled once with a vectorized
+flood fill. Each agent's start and goal are then drawn from the same
+component, so every agent can reach its goal. Starts are unique, goals are
+unique, and both can be restricted to rectangular regions and to a minimum
+Manhattan distance apart.
+
+Usage:
+    python3 scenario_generator.py <map_file> <num_agents> [-o out.scen] [--seed S]
+        [--min-distance D] [--start-region r0,c0,r1,c1] [--goal-region r0,c0,r1,c1]
+        [--disjoint] [--visualize]
+
+Regions are inclusive row/column bounds. ``--visualize`` streams the
+generated agents straight into the dynamic visualizer instead of (or as well
+as) writing a ``version 1`` scenario file.
+"""
+
+import argparse
+import os
+import sys
+import numpy as np
+from typing import Optional, Tuple
+
+import mapf_io
+
+Region = Tuple[int, int, int, int]  # (row0, col0, row1, col1), inclusive
+
+
+def label_components(grid: np.ndarray) -> np.ndarray:
+    """Label 4-connected components of the free cells of ``grid``.
+
+    Returns an int array of the same shape with -1 on blocked cells and a
+    component id 0..k-1 elsewhere. Each free cell starts with its own linear
+    index as label; every iteration takes the minimum over the four
+    neighbours and then shortcuts labels through the cells they point at
+    (pointer jumping), so long corridors converge in a handful of passes
+    rather than one pass per cell.
+    """
+    nrows, ncols = grid.shape
+    free = ~grid
+    big = nrows * ncols
+    labels = np.where(free, np.arange(big).reshape(nrows, ncols), big)
+    flat_free = free.ravel()
+    while True:
+        new = labels.copy()
+        np.minimum(new[1:, :], labels[:-1, :], out=new[1:, :])
+        np.minimum(new[:-1, :], labels[1:, :], out=new[:-1, :])
+        np.minimum(new[:, 1:], labels[:, :-1], out=new[:, 1:])
+        np.minimum(new[:, :-1], labels[:, 1:], out=new[:, :-1])
+        new[grid] = big
+        flat = new.ravel()
+        while True:
+            jumped = flat[flat[flat_free]]
+            if np.array_equal(jumped, flat[flat_free]):
+                break
+            flat[flat_free] = jumped
+        if np.array_equal(new, labels):
+            break
+        labels = new
+    components = np.full(grid.shape, -1, dtype=np.int32)
+    components[free] = np.unique(labels[free], return_inverse=True)[1]
+    return components
+
+
+def region_mask(shape, region: Optional[Region]) -> np.ndarray:
+    mask = np.zeros(shape, dtype=bool)
+    if region is None:
+        mask[:] = True
+    else:
+        r0, c0, r1, c1 = region
+        mask[max(r0, 0):r1 + 1, max(c0, 0):c1 + 1] = True
+    return mask
+
+
+def generate_scenario(grid: np.ndarray, num_agents: int, seed: Optional[int] = None, min_distance: int = 0,
+                      start_region: Optional[Region] = None, goal_region: Optional[Region] = None,
+                      disjoint: bool = False, labels: Optional[np.ndarray] = None):
+    """Sample ``num_agents`` (start, goal) pairs; returns two (num_agents, 2) int arrays of (row, col).
+
+    ``disjoint`` additionally keeps goals off every start cell, as the
+    visualizer's ``add_agent`` requires. Pass precomputed ``labels`` to
+    reuse one component labelling across many scenarios. Raises
+    ``ValueError`` if the constraints cannot be met.
+    """
+    rng = np.random.default_rng(seed)
+    if labels is None:
+        labels = label_components(grid)
+    ncols = grid.shape[1]
+    start_ok = (labels >= 0) & region_mask(grid.shape, start_region)
+    goal_ok = (labels >= 0) & region_mask(grid.shape, goal_region)
+
+    # Only start in components that have somewhere else to go
+    goals_per_component = np.bincount(labels[goal_ok], minlength=labels.max() + 1)
+    start_cells = np.flatnonzero(start_ok.ravel() & (goals_per_component[labels.ravel()] >= 2))
+    if len(start_cells) < num_agents:
+        raise ValueError(f"Only {len(start_cells)} eligible start cells for {num_agents} agents")
+    starts = rng.choice(start_cells, num_agents, replace=False)
+    goals = np.empty(num_agents, dtype=np.int64)
+
+    flat_labels = labels.ravel()
+    goal_cells = np.flatnonzero(goal_ok.ravel())
+    if disjoint:
+        goal_cells = np.setdiff1d(goal_cells, starts, assume_unique=True)
+    start_components = flat_labels[starts]
+    goal_components = flat_labels[goal_cells]
+    for component in np.unique(start_components):
+        agents = np.flatnonzero(start_components == component)
+        pool = rng.permutation(goal_cells[goal_components == component])
+        if len(pool) < len(agents):
+            raise ValueError(f"Component {component} has {len(pool)} goal cells for {len(agents)} agents")
+        chosen = pool[:len(agents)]
+        ok = (chosen != starts[agents]) & (_manhattan(chosen, starts[agents], ncols) >= min_distance)
+        # Give each violating agent the next unused goal from the pool that satisfies it
+        spare = list(pool[len(agents):])
+        for i in np.flatnonzero(~ok):
+            start = starts[agents[i]]
+            for j, cell in enumerate(spare):
+                if cell != start and _manhattan(cell, start, ncols) >= min_distance:
+                    chosen[i] = spare.pop(j)
+                    break
+            else:
+                raise ValueError(f"Could not find a goal at distance >= {min_distance} for start {divmod(int(start), ncols)}")
+        goals[agents] = chosen
+
+    return np.stack(np.divmod(starts, ncols), axis=1), np.stack(np.divmod(goals, ncols), axis=1)
+
+
+def _manhattan(a, b, ncols: int):
+    (ar, ac), (br, bc) = np.divmod(a, ncols), np.divmod(b, ncols)
+    return np.abs(ar - br) + np.abs(ac - bc)
+
+
+def _parse_region(text: str) -> Region:
+    values = tuple(int(x) for x in text.split(','))
+    if len(values) != 4:
+        raise argparse.ArgumentTypeError("Region must be r0,c0,r1,c1")
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a random connectivity-aware MAPF scenario")
+    parser.add_argument('map_file')
+    parser.add_argument('num_agents', type=int)
+    parser.add_argument('-o', '--output', help="Scenario file to write")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--min-distance', type=int, default=0, help="Minimum Manhattan distance from start to goal")
+    parser.add_argument('--start-region', type=_parse_region, default=None, help="r0,c0,r1,c1 bounds for starts")
+    parser.add_argument('--goal-region', type=_parse_region, default=None, help="r0,c0,r1,c1 bounds for goals")
+    parser.add_argument('--disjoint', action='store_true', help="Do not place goals on other agents' starts")
+    parser.add_argument('--visualize', action='store_true', help="Load the agents into the dynamic visualizer")
+    args = parser.parse_args()
+    if not args.output and not args.visualize:
+        parser.error("give --output and/or --visualize")
+
+    grid = mapf_io.load_grid(args.map_file)
+    try:
+        starts, goals = generate_scenario(grid, args.num_agents, args.seed, args.min_distance,
+                                          args.start_region, args.goal_region, args.disjoint or args.visualize)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    starts, goals = [tuple(s) for s in starts.tolist()], [tuple(g) for g in goals.tolist()]
+    if args.output:
+        mapf_io.write_scen_file(args.output, os.path.basename(args.map_file), grid.shape[0], grid.shape[1], starts, goals)
+        print(f"Wrote {len(starts)} agents to {args.output}")
+    if args.visualize:
+        from dynamic_visualizer import DynamicMAPFVisualizer
+        visualizer = DynamicMAPFVisualizer(args.map_file)
+        visualizer.load_agents(starts, goals)
+        visualizer.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""Plan very large instances by sharding the map into regions solved in parallel.
+
+The grid is cut into tiles, either exactly (``--split grid``) or with each
+cut moved to the nearby row or column boundary that crosses the most free
+cells, so cuts run along aisles (``--split aisles``). Every connected piece
+of a tile is one region. Two adjacent free cells in different regions form
+a portal, and each agent follows a route of regions from its start to its
+goal.
+
+Planning proceeds in synchronized phases:
+
+    portals -- each agent that still has to leave its region reserves one
+               free portal (exit cell, entry cell) towards the next region
+               on its route. A portal cell is used by at most one agent per
+               phase and is never a goal or a cell someone is standing on.
+    solve   -- every region with moving agents is solved independently in
+               a process pool: agents head for their exit cell, or their
+               goal on the last leg, and everyone else waits in place.
+    handoff -- after the slowest region finishes, crossing agents turn to
+               face their entry cell and all step across at once.
+
+Regions never share cells and entry cells are free at handoff time, so the
+stitched plan is conflict-free by construction. A final global check with
+``validate.check_paths`` re-routes any agent still in conflict (e.g.
+from a solver that breaks a rule) with ``local_repair``.
+
+Usage:
+    python3 sharded_planner.py <map_file> <scen_file> [--agent-num N] [-o paths.txt]
+        [--tile 32 | --tile 24x48] [--split aisles|grid] [--solver lns|pp]
+        [--workers N] [--cutoff-time S] [--visualize]
+
+``--solver lns`` runs ``./lns`` on each region's sub-map; ``--solver pp``
+uses the built-in prioritized space-time A*, which needs no build. ``pp``
+suits fleets up to about a thousand agents (1000 on the warehouse map take a
+few minutes on one core); use ``lns`` for larger fleets.
+"""
+
+import argparse
+import heapq
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import local_repair
+import mapf_io
+from scenario_generator import label_components
+from validate import HEADING_STEPS, check_paths
+
+# Phases before giving up on agents that never reach their goal region
+MAX_PHASES = 200
+
+# Rounds of the final conflict repair
+REPAIR_ROUNDS = 4
+
+# Single-agent searches a region's prioritized planner may spend per agent, and the size of each
+PP_SEARCHES_PER_AGENT = 4
+PP_MAX_EXPANSIONS = 10000
+
+_HEADING_OF = {tuple(step): o for o, step in enumerate(HEADING_STEPS.tolist())}
+
+
+def tile_cuts(free: np.ndarray, size: int, along_aisles: bool = True) -> List[int]:
+    """Boundaries (0, ..., nrows) splitting the rows of ``free`` into bands of about ``size``.
+
+    With ``along_aisles`` each cut is moved up to ``size // 4`` rows to the
+    boundary with the most free cells on both sides, i.e. into an aisle.
+    Apply to ``free.T`` for column cuts.
+    """
+    n = free.shape[0]
+    cuts = [0]
+    for nominal in range(size, n - size // 2, size):
+        cut = nominal
+        if along_aisles:
+            lo, hi = max(cuts[-1] + size // 2, nominal - size // 4), min(n - size // 2, nominal + size // 4)
+            if lo <= hi:
+                # Boundary b lies between rows b-1 and b
+                crossings = (free[lo - 1:hi] & free[lo:hi + 1]).sum(axis=1)
+                nearest = -np.abs(np.arange(lo, hi + 1) - nominal)
+                cut = lo + int(np.lexsort((nearest, crossings))[-1])
+        cuts.append(cut)
+    cuts.append(n)
+    return cuts
+
+
+def label_regions(grid: np.ndarray, row_cuts: List[int], col_cuts: List[int]) -> np.ndarray:
+    """Region id of every free cell (-1 on obstacles): one region per connected piece of each tile"""
+    labels = np.full(grid.shape, -1, dtype=np.int32)
+    next_id = 0
+    for r0, r1 in zip(row_cuts[:-1], row_cuts[1:]):
+        for c0, c1 in zip(col_cuts[:-1], col_cuts[1:]):
+            tile = label_components(grid[r0:r1, c0:c1])
+            free = tile >= 0
+            labels[r0:r1, c0:c1][free] = tile[free] + next_id
+            next_id += int(tile.max()) + 1 if free.any() else 0
+    return labels
+
+
+def find_portals(labels: np.ndarray) -> Dict[Tuple[int, int], List[Tuple[int, int]]]:
+    """Map (from_region, to_region) to its crossings as (exit_cell, entry_cell) linear indices"""
+    cells = np.arange(labels.size).reshape(labels.shape)
+    u_cells, v_cells, u_regions, v_regions = [], [], [], []
+    for a, b, ia, ib in ((labels[:, :-1], labels[:, 1:], cells[:, :-1], cells[:, 1:]),
+                         (labels[:-1], labels[1:], cells[:-1], cells[1:])):
+        crossing = (a >= 0) & (b >= 0) & (a != b)
+        # Both directions of every crossing
+        u_cells += [ia[crossing], ib[crossing]]
+        v_cells += [ib[crossing], ia[crossing]]
+        u_regions += [a[crossing], b[crossing]]
+        v_regions += [b[crossing], a[crossing]]
+    portals = {}
+    for u, v, ru, rv in zip(*(np.concatenate(x).tolist() for x in (u_cells, v_cells, u_regions, v_regions))):
+        portals.setdefault((ru, rv), []).append((u, v))
+    return portals
+
+
+def region_routes(labels: np.ndarray, portals, starts, goals) -> List[List[int]]:
+    """Sequence of regions from each start to its goal, shortest by distance between region centroids"""
+    ncols = labels.shape[1]
+    num_regions = int(labels.max()) + 1
+    free = labels >= 0
+    rows, cols = np.nonzero(free)
+    counts = np.bincount(labels[free], minlength=num_regions)
+    centroids = np.stack([np.bincount(labels[free], rows, num_regions), np.bincount(labels[free], cols, num_regions)], axis=1)
+    centroids /= np.maximum(counts, 1)[:, None]
+    neighbours = {}
+    for a, b in portals:
+        neighbours.setdefault(a, []).append((b, float(np.abs(centroids[a] - centroids[b]).sum())))
+
+    next_hop = {}  # goal region -> {region: next region towards it}
+    routes = []
+    for i, (start, goal) in enumerate(zip(starts, goals)):
+        first, last = int(labels[start[0], start[1]]), int(labels[goal[0], goal[1]])
+        if last not in next_hop:
+            # Dijkstra outwards from the goal region over the symmetric region graph
+            dist, hops, heap = {last: 0.0}, {last: None}, [(0.0, last)]
+            while heap:
+                d, region = heapq.heappop(heap)
+                if d > dist[region]:
+                    continue
+                for other, weight in neighbours.get(region, ()):
+                    if d + weight < dist.get(other, float('inf')):
+                        dist[other], hops[other] = d + weight, region
+                        heapq.heappush(heap, (d + weight, other))
+            next_hop[last] = hops
+        if first < 0 or first not in next_hop[last]:
+            raise ValueError(f"Agent {i} cannot reach its goal {tuple(goal)} from {tuple(start)}")
+        route = [first]
+        while route[-1] != last:
+            route.append(next_hop[last][route[-1]])
+        routes.append(route)
+    return routes
+
+
+def prioritized_plan(grid: np.ndarray, starts, goals, max_searches: int = None,
+                     max_expansions: int = PP_MAX_EXPANSIONS) -> List[list]:
+    """Plan agents one by one, each around the agents planned so far.
+
+    An agent that cannot get around the others moves to the front: it takes
+    its shortest route around the agents already at the front, and only the
+    agents that route collides with are re-planned. An agent that fails
+    again, or any agent once ``max_searches`` single-agent searches (by
+    default ``PP_SEARCHES_PER_AGENT`` per agent) are spent, gives up on its
+    goal and stays at its start, stepping aside if someone has to pass; the
+    caller sees that its path ends short.
+    """
+    box = (0, 0, grid.shape[0] - 1, grid.shape[1] - 1)
+    goals = [tuple(goal) for goal in goals]
+    budget = PP_SEARCHES_PER_AGENT * len(starts) if max_searches is None else max_searches
+    table = local_repair.ReservationTable({}, grid.shape)
+    paths = [None] * len(starts)
+    front = set()  # Agents moved to the front or stuck at their start; nobody pushes them aside
+
+    def search(i, reservations):
+        nonlocal budget
+        budget -= 1
+        return local_repair.plan_path(grid, starts[i], goals[i], 0, reservations, box, max_expansions)
+
+    # Agents that stay put go first, so everyone else routes around them
+    pending = deque(sorted(range(len(starts)), key=lambda i: tuple(starts[i][:2]) != goals[i]))
+    while pending:
+        i = pending.popleft()
+        path = search(i, table.window(box, 0)) if budget > 0 else None
+        if path is None and budget > 0 and i not in front:
+            front.add(i)
+            window = local_repair.ReservationWindow(grid.shape[1], grid.size)
+            for j in front:
+                if paths[j] is not None:
+                    window.add_path(j, paths[j])
+            path = search(i, window)
+        if path is None and budget > 0 and goals[i] != tuple(starts[i][:2]):
+            goals[i] = tuple(starts[i][:2])
+            path = search(i, table.window(box, 0))
+        if path is None:
+            front.add(i)
+            path = [tuple(starts[i])]
+        paths[i] = path
+        table.set_path(i, path)
+        for other in table.conflicts(i, path, 0):
+            table.remove(other)
+            paths[other] = None
+            pending.append(other)
+    return paths
+
+
+def solve_region(grid: np.ndarray, starts, goals, solver: str = 'pp', cutoff_time: float = 30,
+                 lns_exec: str = './lns') -> Optional[List[list]]:
+    """Solve one region's sub-problem (run in a pool worker); None if the solver fails"""
+    if solver == 'pp':
+        return prioritized_plan(grid, starts, goals)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        map_path = os.path.join(tmpdir, 'region.map')
+        scen_path = os.path.join(tmpdir, 'region.scen')
+        mapf_io.write_map_file(map_path, grid)
+        mapf_io.write_scen_file(scen_path, map_path, grid.shape[0], grid.shape[1], starts, goals)
+        try:
+            return mapf_io.run_lns(map_path, scen_path, len(starts), os.path.join(tmpdir, 'paths.txt'),
+                                   cutoff_time, lns_exec)
+        except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError) as e:
+            print(f"Region solve failed: {e}")
+            return None
+
+
+def _turns(state, orientation: int) -> List[Tuple[int, int, int]]:
+    """In-place 90 degree turns taking ``state`` to ``orientation``"""
+    r, c, o = state
+    diff = (orientation - o) % 4
+    if diff == 3:
+        return [(r, c, orientation)]
+    return [(r, c, (o + k) % 4) for k in range(1, diff + 1)]
+
+
+def _assign_targets(cur, goal_cells, routes, hops, portals, ncols):
+    """Target cell of every agent this phase, plus the portal each crossing agent reserved"""
+    n = len(cur)
+    standing = set(cur)
+    goal_set = set(goal_cells)
+    used = set()
+    targets = list(cur)  # Agents without a portal wait where they are
+    crossing = {}
+    # Agents with the most regions still to cross pick portals first
+    for i in sorted(range(n), key=lambda i: (hops[i] - len(routes[i]), i)):
+        if hops[i] == len(routes[i]) - 1:
+            targets[i] = goal_cells[i]
+            continue
+        r, c = divmod(cur[i], ncols)
+        best = None
+        for u, v in portals[(routes[i][hops[i]], routes[i][hops[i] + 1])]:
+            if u in used or v in used or u in goal_set or v in goal_set or v in standing or (u in standing and u != cur[i]):
+                continue
+            d = abs(u // ncols - r) + abs(u % ncols - c)
+            if best is None or d < best[0]:
+                best = (d, u, v)
+        if best:
+            _, u, v = best
+            targets[i], crossing[i] = u, (u, v)
+            used.update((u, v))
+    # An agent whose goal is blocked by a waiting agent waits too, until no target is shared
+    waiting = {cur[i] for i in range(n) if targets[i] == cur[i]}
+    changed = True
+    while changed:
+        changed = False
+        for i in range(n):
+            if targets[i] != cur[i] and targets[i] in waiting:
+                targets[i] = cur[i]
+                waiting.add(cur[i])
+                changed = True
+    return targets, crossing
+
+
+def plan_sharded(grid: np.ndarray, starts, goals, tile=(32, 32), along_aisles: bool = True, solver: str = 'pp',
+                 workers: int = None, cutoff_time: float = 30, lns_exec: str = './lns', max_phases: int = MAX_PHASES):
+    """Plan all agents; returns (paths, stats) with paths as lists of (row, col, orientation)"""
+    nrows, ncols = grid.shape
+    t_start = time.time()
+    labels = label_regions(grid, tile_cuts(~grid, tile[0], along_aisles), tile_cuts((~grid).T, tile[1], along_aisles))
+    portals = find_portals(labels)
+    routes = region_routes(labels, portals, starts, goals)
+    flat_labels = labels.ravel()
+    boxes = {}
+    for region in range(int(labels.max()) + 1):
+        rows, cols = np.nonzero(labels == region)
+        boxes[region] = (int(rows.min()), int(cols.min()), int(rows.max()), int(cols.max()))
+
+    n = len(starts)
+    states = [(int(r), int(c), 0) for r, c in starts]
+    goal_cells = [int(r) * ncols + int(c) for r, c in goals]
+    paths = [[s] for s in states]
+    hops = [0] * n
+    phases = 0
+    with ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        while phases < max_phases:
+            cur = [r * ncols + c for r, c, _ in states]
+            if all(hops[i] == len(routes[i]) - 1 and cur[i] == goal_cells[i] for i in range(n)):
+                break
+            phases += 1
+            targets, crossing = _assign_targets(cur, goal_cells, routes, hops, portals, ncols)
+
+            # Solve every region that has an agent to move
+            members = {}
+            for i in range(n):
+                members.setdefault(int(flat_labels[cur[i]]), []).append(i)
+            jobs = {}
+            segments = {}
+            for region, agents in members.items():
+                if all(targets[i] == cur[i] for i in agents):
+                    segments.update((i, [states[i]]) for i in agents)
+                    continue
+                r0, c0, r1, c1 = boxes[region]
+                sub = labels[r0:r1 + 1, c0:c1 + 1] != region
+                sub_starts = [(states[i][0] - r0, states[i][1] - c0, states[i][2]) for i in agents]
+                sub_goals = [(targets[i] // ncols - r0, targets[i] % ncols - c0) for i in agents]
+                jobs[region] = pool.submit(solve_region, sub, sub_starts, sub_goals, solver, cutoff_time, lns_exec)
+            for region, future in jobs.items():
+                r0, c0 = boxes[region][:2]
+                result = future.result()
+                if result is None or len(result) != len(members[region]):
+                    continue  # Everyone in a failed region waits this phase
+                for i, path in zip(members[region], result):
+                    segments[i] = [(e[0] + r0, e[1] + c0, e[2] if len(e) > 2 else 0) for e in path]
+            crossing = {i: uv for i, uv in crossing.items()
+                        if i in segments and segments[i][-1][0] * ncols + segments[i][-1][1] == uv[0]}
+            if not crossing and all(len(set(segment)) == 1 for segment in segments.values()):
+                break  # No progress possible
+
+            # Stitch: align orientations in place, run the segments, then hand off across portals
+            prelude = max((len(_turns(states[i], segments[i][0][2])) for i in segments), default=0)
+            length = max((len(s) for s in segments.values()), default=1)
+            for i in range(n):
+                path = paths[i]
+                if i in segments:
+                    turns = _turns(states[i], segments[i][0][2])
+                    path += turns + [segments[i][0]] * (prelude - len(turns)) + segments[i][1:]
+                    path += [path[-1]] * (length - len(segments[i]))
+                else:
+                    path += [path[-1]] * (prelude + length - 1)
+            headings = {i: _HEADING_OF[(v // ncols - u // ncols, v % ncols - u % ncols)] for i, (u, v) in crossing.items()}
+            handoff = 1 + max((len(_turns(paths[i][-1], heading)) for i, heading in headings.items()), default=-1)
+            for i in range(n):
+                path = paths[i]
+                if i in crossing:
+                    u, v = crossing[i]
+                    heading = headings[i]
+                    turns = _turns(path[-1], heading)
+                    path += turns + [(u // ncols, u % ncols, heading)] * (handoff - 1 - len(turns))
+                    path.append((v // ncols, v % ncols, heading))
+                    hops[i] += 1
+                else:
+                    path += [path[-1]] * handoff
+                states[i] = path[-1]
+
+    # Agents stranded by max_phases finish with a global A* around everyone else
+    pending = [i for i in range(n) if (states[i][0], states[i][1]) != tuple(goals[i])]
+    if pending:
+        table = local_repair.ReservationTable(dict(enumerate(paths)), grid.shape)
+        for i in pending:
+            repaired = local_repair.repair_goal_change(table, grid, dict(enumerate(paths)), i, tuple(goals[i]),
+                                                      len(paths[i]) - 1)
+            if repaired:
+                for agent, path in repaired.items():
+                    paths[agent] = path
+    paths = [_trim(path) for path in paths]
+    repaired, remaining = repair_conflicts(grid, paths, goals)
+    lengths = np.array([len(p) for p in paths])
+    stats = dict(regions=len(boxes), portals=sum(len(p) for p in portals.values()) // 2, phases=phases,
+                 makespan=int(lengths.max(initial=0)), sum_of_costs=int((lengths - 1).sum()),
+                 unfinished=sum((p[-1][0], p[-1][1]) != tuple(g) for p, g in zip(paths, goals)),
+                 repaired=repaired, remaining_conflicts=remaining, seconds=round(time.time() - t_start, 2))
+    return paths, stats
+
+
+def _trim(path):
+    """Drop the waits at the end of a path; agents keep their last cell anyway"""
+    end = len(path)
+    while end > 1 and path[end - 1] == path[end - 2]:
+        end -= 1
+    return path[:end]
+
+
+def repair_conflicts(grid: np.ndarray, paths: list, goals, rounds: int = REPAIR_ROUNDS) -> Tuple[int, int]:
+    """Re-route agents in conflict around everyone else, in place.
+
+    Each round re-routes the second agent of every conflict from a little
+    before the conflict, starting further back every round. Returns the
+    number of agents re-routed and the number of conflicts left.
+    """
+    repaired = set()
+    for round_ in range(rounds):
+        report = check_paths(grid, paths, max_details=sys.maxsize)
+        if report.valid:
+            return len(repaired), 0
+        first = {}
+        for detail in report.details:
+            agent = detail['agents'][1]
+            first[agent] = min(first.get(agent, detail['timestep']), detail['timestep'])
+        table = local_repair.ReservationTable(dict(enumerate(paths)), grid.shape)
+        for agent, t in sorted(first.items(), key=lambda item: item[1]):
+            t0 = max(0, t - 2 ** round_)
+            result = local_repair.repair_goal_change(table, grid, dict(enumerate(paths)), agent, tuple(goals[agent]), t0)
+            if result is None:
+                table = local_repair.ReservationTable(dict(enumerate(paths)), grid.shape)
+                continue
+            for other, path in result.items():
+                paths[other] = path
+                repaired.add(other)
+    return len(repaired), sum(check_paths(grid, paths).counts.values())
+
+
+def _parse_tile(text: str) -> Tuple[int, int]:
+    rows, _, cols = text.lower().partition('x')
+    return int(rows), int(cols or rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan a large MAPF instance region by region in parallel")
+    parser.add_argument('map_file')
+    parser.add_argument('scen_file')
+    parser.add_argument('--agent-num', type=int, default=None)
+    parser.add_argument('-o', '--output', default='paths.txt', help="Paths file to write")
+    parser.add_argument('--tile', type=_parse_tile, default=(32, 32), help="Tile size, e.g. 32 or 24x48 (rows x cols)")
+    parser.add_argument('--split', choices=('aisles', 'grid'), default='aisles', help="Move cuts into aisles or tile exactly")
+    parser.add_argument('--solver', choices=('lns', 'pp'), default='lns', help="Per-region solver")
+    parser.add_argument('--lns-exec', default='./lns')
+    parser.add_argument('--workers', type=int, default=None, help="Region processes (default: all cores)")
+    parser.add_argument('--cutoff-time', type=float, default=30, help="Per-region solver time limit")
+    parser.add_argument('--max-phases', type=int, default=MAX_PHASES)
+    parser.add_argument('--visualize', action='store_true', help="Show the plan in the dynamic visualizer")
+    args = parser.parse_args()
+
+    if args.solver == 'lns' and not os.path.exists(args.lns_exec):
+        print(f"Error: {args.lns_exec} not found; build it or use --solver pp")
+        sys.exit(1)
+    grid = mapf_io.load_grid(args.map_file)
+    starts, goals = mapf_io.parse_scen_file(args.scen_file, args.agent_num, *grid.shape)
+    try:
+        paths, stats = plan_sharded(grid, starts, goals, args.tile, args.split == 'aisles', args.solver,
+                                    args.workers, args.cutoff_time, args.lns_exec, args.max_phases)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    mapf_io.write_paths_file(args.output, paths)
+    print(", ".join(f"{k}: {v}" for k, v in stats.items()))
+    print(f"Wrote {len(paths)} paths to {args.output}")
+    if args.visualize:
+        from dynamic_visualizer import DynamicMAPFVisualizer
+        visualizer = DynamicMAPFVisualizer(args.map_file)
+        visualizer.load_plan(starts, goals, paths)
+        visualizer.run()
+
+
+if __name__ == '__main__':
+    main()
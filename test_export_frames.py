@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import os
+import stat
+import tempfile
+
+import mapf_io
+from export_frames import export
+
+def test_export_png_sequence():
+    """Exporting paths.txt writes one PNG per (interpolated) frame"""
+    grid = mapf_io.load_grid("random-32-32-20.map")
+    paths = mapf_io.parse_paths_file("paths.txt")[:3]
+    makespan = max(len(p) for p in paths)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        num_frames = export(grid, paths, tmpdir, substeps=2, cell_size=8, workers=2)
+        assert num_frames == (makespan - 1) * 2 + 1
+        assert sorted(os.listdir(tmpdir))[0] == "frame_00000.png"
+        assert len(os.listdir(tmpdir)) == num_frames
+
+def test_ffmpeg_failure_is_reported():
+    """An ffmpeg that exits without reading its input is an export error, not a broken pipe"""
+    grid = mapf_io.load_grid("random-32-32-20.map")
+    paths = mapf_io.parse_paths_file("paths.txt")[:3]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fake = os.path.join(tmpdir, "ffmpeg")
+        with open(fake, "w") as f:
+            f.write("#!/bin/sh\necho 'Unknown encoder libx264' >&2\nexit 1\n")
+        os.chmod(fake, os.stat(fake).st_mode | stat.S_IEXEC)
+        old_path = os.environ["PATH"]
+        os.environ["PATH"] = tmpdir + os.pathsep + old_path
+        try:
+            export(grid, paths, os.path.join(tmpdir, "out.mp4"), cell_size=8, workers=1)
+            raise AssertionError("Expected RuntimeError")
+        except RuntimeError as e:
+            assert "code 1" in str(e) and "libx264" in str(e)
+        finally:
+            os.environ["PATH"] = old_path
+
+if __name__ == "__main__":
+    test_export_png_sequence()
+    test_ffmpeg_failure_is_reported()
+    print("Export test passed!")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+import mapf_io
+from local_repair import ReservationTable, plan_path, repair_goal_change
+from scenario_generator import generate_scenario
+from validate import check_paths
+
+def _conflicts(grid, paths):
+    """Violations of a plan, checking each path's moves from its own first to its own last cell"""
+    starts = {i: path[0][:2] for i, path in paths.items()}
+    goals = {i: path[-1][:2] for i, path in paths.items()}
+    return check_paths(grid, paths, starts, goals).counts
+
+def test_goal_changes_stay_conflict_free():
+    """Redirected agents only change their own path when they can route around the others"""
+    grid = mapf_io.load_grid("random-32-32-20.map")
+    starts, goals = generate_scenario(grid, 30, seed=2, disjoint=True)
+    table = ReservationTable({}, grid.shape)
+    paths = {}
+    for i, (s, g) in enumerate(zip(starts.tolist(), goals.tolist())):
+        paths[i] = plan_path(grid, (s[0], s[1], 0), tuple(g), 0, table.window((0, 0, 31, 31), 0))
+        table.set_path(i, paths[i])
+    assert not _conflicts(grid, paths)
+
+    table = ReservationTable(paths, grid.shape)
+    for agent, goal, t0 in [(3, (0, 16), 4), (17, (31, 12), 9), (3, (7, 11), 2)]:
+        before = dict(paths)
+        repaired = repair_goal_change(table, grid, paths, agent, goal, t0)
+        assert repaired is not None and list(repaired) == [agent]
+        paths.update(repaired)
+        assert paths[agent][:t0] == before[agent][:t0] and paths[agent][-1][:2] == goal
+        assert not _conflicts(grid, paths)
+
+def test_goal_change_moves_blocking_agent():
+    """An agent parked in a corridor steps into a side pocket to let the redirected agent past"""
+    grid = np.array([[ch != '.' for ch in row] for row in ["#########", ".........", "####.####"]])
+    paths = {0: [(1, 0, 1)], 1: [(1, 5, 3), (1, 5, 3)]}
+    table = ReservationTable(paths, grid.shape)
+    repaired = repair_goal_change(table, grid, paths, 0, (1, 8), 0)
+    assert sorted(repaired) == [0, 1]
+    assert repaired[0][-1][:2] == (1, 8) and repaired[1][-1][:2] == (1, 5)
+    assert not _conflicts(grid, repaired)
+
+def test_removal_frees_reservations():
+    """Once the blocking agent is removed, the corridor is free without touching anyone else"""
+    grid = np.array([[ch != '.' for ch in row] for row in [".........."]])
+    table = ReservationTable({0: [(0, 0, 1)], 1: [(0, 5, 3)]}, grid.shape)
+    assert plan_path(grid, (0, 0, 1), (0, 9), 0, table.window((0, 0, 0, 9), 0)) is None
+    table.remove(1)
+    assert len(plan_path(grid, (0, 0, 1), (0, 9), 0, table.window((0, 0, 0, 9), 0))) == 10
+
+if __name__ == "__main__":
+    test_goal_changes_stay_conflict_free()
+    test_goal_change_moves_blocking_agent()
+    test_removal_frees_reservations()
+    print("All local repair tests passed!")
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+from path_analytics import analyze_paths
+
+def test_counts_waits_rotations_and_concurrency():
+    """Waits, in-place rotations and moves are counted separately per cell"""
+    paths = [
+        [(0, 0, 1), (0, 0, 1), (0, 1, 1), (0, 1, 2), (1, 1, 2)],  # wait, move, rotate, move
+        [(2, 2, 0), (2, 2, 0)],                                   # wait, then parked at goal
+    ]
+    analytics = analyze_paths(paths, 3, 3)
+    assert analytics.visits[0, 0] == 2 and analytics.visits[0, 1] == 2 and analytics.visits[1, 1] == 1
+    assert analytics.visits.sum() == 7  # parking after the end of a path is not counted
+    assert analytics.waits[0, 0] == 1 and analytics.waits[2, 2] == 1 and analytics.waits.sum() == 2
+    assert analytics.rotations[0, 1] == 1 and analytics.rotations.sum() == 1
+    assert analytics.active.tolist() == [2, 2, 1, 1, 1]
+    assert analytics.moving.tolist() == [0, 1, 0, 1]
+    assert analytics.waiting.tolist() == [2, 0, 0, 0]
+    assert analytics.rotating.tolist() == [0, 0, 1, 0]
+    assert np.array_equal(analytics.visits.shape, (3, 3))
+
+if __name__ == "__main__":
+    test_counts_waits_rotations_and_concurrency()
+    print("Path analytics test passed!")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from planning_server import PlanningServer, SessionClient
+
+def stay_in_place(map_file, starts, goals, cutoff_time=30):
+    """Stand-in replan job for when ./lns is not built: every agent waits at its start"""
+    time.sleep(0.1)
+    return [[(s[0], s[1], 0), (s[0], s[1], 0)] for s in starts]
+
+def stall_on_one_agent(map_file, starts, goals, cutoff_time=30):
+    """Replan job that behaves like a solver running to its full cutoff when given a single agent"""
+    if len(starts) == 1:
+        time.sleep(60)
+    return stay_in_place(map_file, starts, goals, cutoff_time)
+
+def _post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), method='POST',
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.status, json.loads(response.read())
+
+def _wait_for_version(client, version, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        state = client.get_state()
+        if state['version'] >= version and state['status'] != 'planning':
+            return state
+        time.sleep(0.05)
+    raise AssertionError(f"Session never reached plan version {version}")
+
+def test_sessions_replan_through_the_pool():
+    """Sessions are independent, replans run on the pool and superseded results are dropped"""
+    server = PlanningServer(port=0, max_workers=1, job_fn=stay_in_place)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        _, first = _post(server.url + '/sessions', {'map_file': 'random-32-32-20.map'})
+        _, second = _post(server.url + '/sessions', {'map_file': 'random-32-32-20.map', 'priority': 1})
+        a = SessionClient(f"{server.url}/sessions/{first['id']}")
+        b = SessionClient(f"{server.url}/sessions/{second['id']}")
+
+        a.add_agent((0, 0), (0, 5))
+        a.add_agent((2, 0), (2, 5))  # Supersedes the replan queued by the first agent
+        b.add_agent((3, 3), (4, 4))
+        state = _wait_for_version(a, 1)
+        assert len(state['paths']) == 2
+        assert _wait_for_version(b, 1)['agents'][0]['goal'] == [4, 4]
+        time.sleep(0.3)
+        assert a.get_state()['version'] == 1  # The superseded result was never installed
+        assert 'paths' not in a.get_state(since_version=1)
+
+        try:
+            a.add_agent((0, 10), (0, 11))  # (0,10) is an obstacle
+            raise AssertionError("Expected HTTP 400")
+        except urllib.error.HTTPError as e:
+            assert e.code == 400
+        try:
+            SessionClient(server.url + '/sessions/99').get_state()
+            raise AssertionError("Expected HTTP 404")
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+    finally:
+        server.shutdown()
+
+def test_remove_and_redirect_without_replanning():
+    """Removing an agent and changing a goal are applied at once, without a pool job"""
+    server = PlanningServer(port=0, max_workers=1, job_fn=stay_in_place)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        _, created = _post(server.url + '/sessions', {'map_file': 'random-32-32-20.map'})
+        client = SessionClient(f"{server.url}/sessions/{created['id']}")
+        first = client.add_agent((0, 0), (0, 1))['agent_id']
+        second = client.add_agent((2, 2), (3, 4))['agent_id']
+        version = _wait_for_version(client, 1)['version']
+
+        result = client.change_goal(first, (0, 3))
+        assert result['repaired'] == [first] and result['version'] == version + 1
+        state = client.get_state()
+        assert state['agents'][0]['goal'] == [0, 3] and state['paths'][0][-1][:2] == [0, 3]
+        assert state['paths'][1] == [[2, 2, 0], [2, 2, 0]]  # Not in the way, so untouched
+
+        assert client.remove_agent(second)['version'] == version + 2
+        assert [agent['id'] for agent in client.get_state()['agents']] == [first]
+        try:
+            client.remove_agent(second)
+            raise AssertionError("Expected HTTP 400")
+        except urllib.error.HTTPError as e:
+            assert e.code == 400
+    finally:
+        server.shutdown()
+
+def test_superseded_running_job_is_killed():
+    """A running replan is killed when superseded or when its session closes, freeing the only worker"""
+    server = PlanningServer(port=0, max_workers=1, job_fn=stall_on_one_agent)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        _, created = _post(server.url + '/sessions', {'map_file': 'random-32-32-20.map'})
+        client = SessionClient(f"{server.url}/sessions/{created['id']}")
+        client.add_agent((0, 0), (0, 5))
+        time.sleep(1)  # Let the stalling job start
+        assert server.scheduler.running() == 1
+        client.add_agent((2, 0), (2, 5))
+        assert len(_wait_for_version(client, 1, timeout=15)['paths']) == 2
+
+        _, other = _post(server.url + '/sessions', {'map_file': 'random-32-32-20.map'})
+        SessionClient(f"{server.url}/sessions/{other['id']}").add_agent((0, 0), (0, 5))
+        time.sleep(1)
+        assert server.scheduler.running() == 1
+        request = urllib.request.Request(f"{server.url}/sessions/{other['id']}", method='DELETE')
+        urllib.request.urlopen(request, timeout=10).close()
+        deadline = time.time() + 5
+        while server.scheduler.running() and time.time() < deadline:
+            time.sleep(0.05)
+        assert server.scheduler.running() == 0
+    finally:
+        server.shutdown()
+
+def test_missing_scen_file_is_rejected():
+    """A scenario that cannot be read is a 400 and leaves no session behind"""
+    server = PlanningServer(port=0, max_workers=1, job_fn=stay_in_place)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        try:
+            _post(server.url + '/sessions', {'map_file': 'random-32-32-20.map', 'scen_file': 'missing.scen', 'agent_num': 5})
+            raise AssertionError("Expected HTTP 400")
+        except urllib.error.HTTPError as e:
+            assert e.code == 400 and 'missing.scen' in json.loads(e.read())['error']
+        assert server.sessions == {}
+        status, created = _post(server.url + '/sessions', {'map_file': 'random-32-32-20.map',
+                                                           'scen_file': 'random-32-32-20-random-1.scen', 'agent_num': 5})
+        assert status == 201 and len(server.get_session(created['id']).agents) == 5
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    test_sessions_replan_through_the_pool()
+    test_remove_and_redirect_without_replanning()
+    test_superseded_running_job_is_killed()
+    test_missing_scen_file_is_rejected()
+    print("Planning server test passed!")
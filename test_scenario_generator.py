@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+import mapf_io
+from scenario_generator import generate_scenario, label_components
+
+def test_label_components():
+    """A wall splits the grid into two components; blocked cells are -1"""
+    grid = np.zeros((4, 5), dtype=bool)
+    grid[:, 2] = True
+    labels = label_components(grid)
+    assert (labels[:, 2] == -1).all()
+    assert len(np.unique(labels[:, :2])) == 1 and len(np.unique(labels[:, 3:])) == 1
+    assert labels[0, 0] != labels[0, 4]
+
+def test_generated_agents_are_solvable_and_unique():
+    """Starts and goals are unique, free, connected and respect distance and regions"""
+    grid = mapf_io.load_grid("warehouse-20-40-10-2-2.map")
+    labels = label_components(grid)
+    starts, goals = generate_scenario(grid, 2000, seed=7, min_distance=20,
+                                      goal_region=(0, 0, 80, 339), disjoint=True, labels=labels)
+    assert len({tuple(s) for s in starts.tolist()}) == 2000
+    assert len({tuple(g) for g in goals.tolist()}) == 2000
+    assert not set(map(tuple, starts.tolist())) & set(map(tuple, goals.tolist()))
+    assert not grid[starts[:, 0], starts[:, 1]].any() and not grid[goals[:, 0], goals[:, 1]].any()
+    assert (labels[starts[:, 0], starts[:, 1]] == labels[goals[:, 0], goals[:, 1]]).all()
+    assert (np.abs(starts - goals).sum(axis=1) >= 20).all()
+    assert (goals[:, 0] <= 80).all()
+
+if __name__ == "__main__":
+    test_label_components()
+    test_generated_agents_are_solvable_and_unique()
+    print("All scenario generator tests passed!")
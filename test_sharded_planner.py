@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+import mapf_io
+from scenario_generator import generate_scenario
+from sharded_planner import label_regions, plan_sharded, prioritized_plan, tile_cuts
+from validate import check_paths
+
+def test_cuts_follow_aisles():
+    """Cuts move to the nearby boundary with the most free crossings; each tile piece is a region"""
+    free = np.zeros((12, 6), dtype=bool)
+    free[4:6] = True  # A two-row aisle
+    assert tile_cuts(free, 6, along_aisles=False) == [0, 6, 12]
+    assert tile_cuts(free, 6, along_aisles=True) == [0, 5, 12]
+    grid = np.zeros((4, 4), dtype=bool)
+    grid[:, 1] = True
+    labels = label_regions(grid, [0, 4], [0, 4])
+    assert labels[0, 0] != labels[0, 2] and (labels[:, 1] == -1).all()
+
+def test_stuck_agents_stay_put():
+    """Agents that cannot pass each other, or that run out of searches, wait at their start"""
+    grid = np.zeros((1, 4), dtype=bool)
+    starts, goals = [(0, 0, 1), (0, 3, 3)], [(0, 3), (0, 0)]
+    for max_searches in (None, 0):
+        paths = prioritized_plan(grid, starts, goals, max_searches)
+        assert check_paths(grid, paths).valid
+        assert [path[-1] for path in paths] == starts
+    paths = prioritized_plan(grid, starts[:1], goals[:1], max_searches=1)
+    assert paths[0][-1][:2] == goals[0]
+
+def test_sharded_plan_is_valid():
+    """Regions are planned separately and stitched into one conflict-free plan"""
+    grid = mapf_io.load_grid("random-32-32-20.map")
+    starts, goals = generate_scenario(grid, 40, seed=4)
+    starts, goals = [tuple(s) for s in starts.tolist()], [tuple(g) for g in goals.tolist()]
+    paths, stats = plan_sharded(grid, starts, goals, tile=(12, 12), solver='pp', workers=2)
+    assert stats['regions'] > 4 and stats['unfinished'] == 0
+
+    report = check_paths(grid, paths, starts, goals)
+    assert report.valid, report.format_text()
+
+if __name__ == "__main__":
+    test_cuts_follow_aisles()
+    test_stuck_agents_stay_put()
+    test_sharded_plan_is_valid()
+    print("All sharded planner tests passed!")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+from sim_clock import SimulationClock, interpolate_pose
+
+def test_speed_is_clamped():
+    """Speed multipliers stay within 0.1x .. 1000x"""
+    clock = SimulationClock()
+    assert clock.set_speed(0.01) == SimulationClock.MIN_SPEED
+    assert clock.set_speed(5000) == SimulationClock.MAX_SPEED
+    clock.set_speed(1)
+    for _ in range(20):
+        clock.faster()
+    assert clock.speed == SimulationClock.MAX_SPEED
+
+def test_advance_is_independent_of_frame_rate():
+    """The same real time yields the same number of timesteps at any FPS"""
+    for fps in (5, 30, 144):
+        clock = SimulationClock(steps_per_second=1.0, speed=10)
+        steps = sum(clock.advance(1.0 / fps) for _ in range(fps * 3))
+        assert steps in (29, 30)
+
+def test_frame_skipping_and_alpha():
+    """Slow frames simulate several timesteps and keep the remainder as alpha"""
+    clock = SimulationClock(steps_per_second=1.0, speed=100, max_frame_time=0.5)
+    assert clock.advance(0.125) == 12
+    assert abs(clock.alpha - 0.5) < 1e-9
+    # A long stall is clamped instead of jumping the whole fleet forward
+    clock.reset()
+    assert clock.advance(10.0) == 50
+
+def test_interpolate_pose():
+    """Positions blend linearly and rotations take the shortest way round"""
+    r, c, angle = interpolate_pose((2, 3, 1), (2, 4, 1), 0.5)
+    assert (r, c, angle) == (2, 3.5, 0.0)
+    # West (180) to North (-90) is a single right turn, not three left turns
+    _, _, angle = interpolate_pose((0, 0, 3), (0, 0, 0), 0.5)
+    assert angle == 225.0
+    _, _, angle = interpolate_pose((0, 0, 0), (0, 0, 3), 0.5)
+    assert angle == -135.0
+
+if __name__ == "__main__":
+    test_speed_is_clamped()
+    test_advance_is_independent_of_frame_rate()
+    test_frame_skipping_and_alpha()
+    test_interpolate_pose()
+    print("All simulation clock tests passed!")
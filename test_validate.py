@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+
+from validate import validate_solution
+
+MAP = """type octile
+height 3
+width 4
+map
+....
+.@..
+....
+"""
+
+def _write_instance(tmpdir, scen_rows, paths_text):
+    map_path = os.path.join(tmpdir, 'test.map')
+    scen_path = os.path.join(tmpdir, 'test.scen')
+    paths_path = os.path.join(tmpdir, 'paths.txt')
+    with open(map_path, 'w') as f:
+        f.write(MAP)
+    with open(scen_path, 'w') as f:
+        f.write('version 1\n')
+        for i, (sr, sc, gr, gc) in enumerate(scen_rows):
+            f.write(f'{i}\ttest.map\t4\t3\t{sc}\t{sr}\t{gc}\t{gr}\t0\n')
+    with open(paths_path, 'w') as f:
+        f.write(paths_text)
+    return map_path, scen_path, paths_path
+
+def test_valid_solution():
+    """Forward moves, rotations and waits in the solver's own output format pass"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = _write_instance(tmpdir, [(0, 0, 0, 2), (2, 3, 2, 3)],
+                                "Agent 0:(0,0,0)->(0,0,1)->(0,1,1)->(0,1,1)->(0,2,1)->\n"
+                                "Agent 1:(2,3,0)->(2,3,0)->\n")
+        report = validate_solution(*files, agent_num=2)
+        assert report.valid, report.format_text()
+        assert report.summary == {'num_agents': 2, 'makespan': 5, 'sum_of_costs': 5}
+
+def test_violations_are_reported():
+    """Obstacles, sideways moves, wrong goals and both conflict kinds are caught"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = _write_instance(tmpdir, [(0, 1, 2, 1), (0, 2, 0, 1), (2, 0, 0, 3), (2, 3, 2, 3)],
+                                "Agent 0: (0,1,2) -> (1,1,2) -> (2,1,2)\n"   # through the obstacle
+                                "Agent 1: (0,2,3) -> (0,1,3)\n"              # legal
+                                "Agent 2: (2,0,0) -> (2,1,0)\n"              # sideways while facing north, wrong goal
+                                "Agent 3: (2,3,0) -> (2,2,3) -> (2,1,3)\n")  # turns while moving, wrong goal, all three meet at (2,1)
+        report = validate_solution(*files)
+        assert not report.valid
+        assert report.counts['obstacle'] == 1
+        assert report.counts['illegal_move'] == 2
+        assert report.counts['wrong_goal'] == 2
+        assert report.counts['vertex'] == 3  # One per pair of the three agents at (2,1)
+        kinds = {d['type'] for d in report.details}
+        assert {'obstacle', 'illegal_move', 'wrong_goal', 'vertex'} <= kinds
+
+def test_swap_conflict():
+    """Two agents exchanging cells in one timestep is a swap conflict"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = _write_instance(tmpdir, [(0, 2, 0, 3), (0, 3, 0, 2)],
+                                "Agent 0: (0,2,1) -> (0,3,1)\n"
+                                "Agent 1: (0,3,3) -> (0,2,3)\n")
+        report = validate_solution(*files)
+        assert report.counts == {'swap': 1}
+        assert report.details[0]['agents'] == [0, 1]
+
+if __name__ == "__main__":
+    test_valid_solution()
+    test_violations_are_reported()
+    test_swap_conflict()
+    print("All validator tests passed!")
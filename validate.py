@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""Check that a paths file is a legal solution for a map and scenario.
+
+The paths file (as written by ``LNS::writePathsToFile`` or the visualizer)
+is streamed one agent at a time and every per-agent rule is checked with
+array operations on that agent's states:
+
+    out_of_bounds     -- a state lies outside the map
+    obstacle          -- a state enters a blocked cell
+    bad_orientation   -- an orientation outside 0..3
+    illegal_move      -- a step that is not a wait, a 90 degree in-place
+                         rotation, or one cell forward in the current heading
+    wrong_start       -- the path does not start at the scenario start
+    wrong_goal        -- the path does not end at the scenario goal
+    empty_path, unknown_agent, duplicate_agent, missing_agent
+
+Conflicts between agents are then found for all timesteps at once by
+sorting (timestep, cell) keys: two agents in the same cell at the same
+timestep is a ``vertex`` conflict, two agents exchanging cells between
+t and t+1 is a ``swap`` conflict. Agents keep occupying their goal after
+their path ends.
+
+Usage:
+    python3 validate.py <map_file> <scen_file> <paths_file> [--agent-num N] [--format json|text]
+
+Exit status is 0 for a valid solution, 1 if any rule is violated and 2 if
+the inputs cannot be read. The report is printed as JSON by default.
+"""
+
+import argparse
+import json
+import sys
+import numpy as np
+
+import mapf_io
+
+# Forward step (d_row, d_col) for each orientation: N, E, S, W
+HEADING_STEPS = np.array([(-1, 0), (0, 1), (1, 0), (0, -1)], dtype=np.int32)
+
+# Timesteps per chunk when sorting conflict keys, to bound memory on huge plans
+CONFLICT_CHUNK = 256
+
+
+class ValidationReport:
+    """Counts every violation and keeps details for the first ``max_details``"""
+
+    def __init__(self, max_details: int = 20):
+        self.max_details = max_details
+        self.counts = {}
+        self.details = []
+        self.summary = {}
+
+    def add(self, kind: str, count: int = 1, **detail):
+        self.counts[kind] = self.counts.get(kind, 0) + int(count)
+        if len(self.details) < self.max_details:
+            self.details.append(dict(type=kind, **detail))
+
+    @property
+    def valid(self) -> bool:
+        return not self.counts
+
+    def as_dict(self):
+        return dict(valid=self.valid, **self.summary, violation_counts=self.counts, violations=self.details)
+
+    def format_text(self) -> str:
+        lines = [f"{'VALID' if self.valid else 'INVALID'}: " +
+                 ", ".join(f"{k}={v}" for k, v in self.summary.items())]
+        for kind, count in sorted(self.counts.items()):
+            lines.append(f"  {kind}: {count}")
+        for detail in self.details:
+            lines.append("  - " + ", ".join(f"{k}={v}" for k, v in detail.items()))
+        return "\n".join(lines)
+
+
+def check_agent_path(report: ValidationReport, agent_id: int, states: np.ndarray, grid: np.ndarray,
+                     start, goal):
+    """Check the single-agent rules for one path, recording violations in ``report``"""
+    nrows, ncols = grid.shape
+    rows, cols = states[:, 0], states[:, 1]
+    inside = (rows >= 0) & (rows < nrows) & (cols >= 0) & (cols < ncols)
+    if not inside.all():
+        t = int(np.argmin(inside))
+        report.add('out_of_bounds', np.count_nonzero(~inside), agent=agent_id, timestep=t, cell=states[t, :2].tolist())
+    blocked = np.zeros(len(states), dtype=bool)
+    blocked[inside] = grid[rows[inside], cols[inside]]
+    if blocked.any():
+        t = int(np.argmax(blocked))
+        report.add('obstacle', np.count_nonzero(blocked), agent=agent_id, timestep=t, cell=states[t, :2].tolist())
+
+    d_rows = np.diff(rows)
+    d_cols = np.diff(cols)
+    moved = (d_rows != 0) | (d_cols != 0)
+    if states.shape[1] == 3:
+        orientations = states[:, 2]
+        bad = (orientations < 0) | (orientations > 3)
+        if bad.any():
+            t = int(np.argmax(bad))
+            report.add('bad_orientation', np.count_nonzero(bad), agent=agent_id, timestep=t, orientation=int(orientations[t]))
+            orientations = orientations % 4
+        turn = np.diff(orientations) % 4
+        heading = HEADING_STEPS[orientations[:-1]]
+        legal = np.where(moved,
+                         (turn == 0) & (d_rows == heading[:, 0]) & (d_cols == heading[:, 1]),
+                         turn != 2)
+    else:
+        legal = np.abs(d_rows) + np.abs(d_cols) <= 1
+    if not legal.all():
+        t = int(np.argmin(legal))
+        report.add('illegal_move', np.count_nonzero(~legal), agent=agent_id, timestep=t,
+                   step=[states[t].tolist(), states[t + 1].tolist()])
+
+    if tuple(states[0, :2]) != tuple(start):
+        report.add('wrong_start', agent=agent_id, expected=[int(x) for x in start], actual=states[0, :2].tolist())
+    if tuple(states[-1, :2]) != tuple(goal):
+        report.add('wrong_goal', agent=agent_id, expected=[int(x) for x in goal], actual=states[-1, :2].tolist())
+
+
+def find_conflicts(report: ValidationReport, cells: np.ndarray, agent_ids: np.ndarray, ncols: int, num_cells: int):
+    """Record vertex and swap conflicts between all agents.
+
+    ``cells`` is a (num_agents, makespan) array of linear cell indices with
+    each agent padded at its final cell. Conflicts are counted per pair of
+    agents: k agents in one cell at one timestep are k*(k-1)/2 vertex
+    conflicts. Details are reported as (row, col) cells.
+    """
+    num_agents, makespan = cells.shape
+    if num_agents < 2:
+        return
+    for t0 in range(0, makespan, CONFLICT_CHUNK):
+        t1 = min(t0 + CONFLICT_CHUNK, makespan)
+        times = np.arange(t0, t1, dtype=np.int64)[None, :]
+        agents = np.broadcast_to(agent_ids[:, None], (num_agents, t1 - t0)).ravel()
+
+        # Vertex conflicts: equal (timestep, cell) keys are adjacent once sorted
+        keys = (times * num_cells + cells[:, t0:t1]).ravel()
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        dup = np.flatnonzero(sorted_keys[1:] == sorted_keys[:-1]) + 1
+        if len(dup):
+            # Each run of k equal keys contributes k-1 entries to dup and k*(k-1)/2 pairs
+            run_starts = dup[np.r_[True, np.diff(dup) > 1]] - 1
+            run_lengths = np.diff(np.r_[np.searchsorted(dup, run_starts + 1), len(dup)]) + 1
+            report.counts['vertex'] = report.counts.get('vertex', 0) + int((run_lengths * (run_lengths - 1) // 2).sum())
+            for start, length in zip(run_starts.tolist(), run_lengths.tolist()):
+                if len(report.details) >= report.max_details:
+                    break
+                t, cell = divmod(int(sorted_keys[start]), num_cells)
+                group = agents[order[start:start + length]].tolist()
+                for k, a in enumerate(group):
+                    for b in group[k + 1:]:
+                        if len(report.details) < report.max_details:
+                            report.details.append(dict(type='vertex', agents=[a, b], timestep=t,
+                                                       cell=list(divmod(cell, ncols))))
+
+        # Swap conflicts: one agent moves u -> v while another moves v -> u
+        t_end = min(t1, makespan - 1)
+        if t_end <= t0:
+            continue
+        u = cells[:, t0:t_end].astype(np.int64)
+        v = cells[:, t0 + 1:t_end + 1].astype(np.int64)
+        step_times = np.arange(t0, t_end, dtype=np.int64)[None, :]
+        moving = (u != v).ravel()
+        fwd = ((step_times * num_cells + u) * num_cells + v).ravel()[moving]
+        rev = ((step_times * num_cells + v) * num_cells + u).ravel()[moving]
+        step_agents = np.broadcast_to(agent_ids[:, None], u.shape).ravel()[moving]
+        swapped = np.flatnonzero(np.isin(fwd, rev))
+        if len(swapped):
+            order = np.argsort(fwd)
+            sorted_fwd = fwd[order]
+            lo = np.searchsorted(sorted_fwd, rev[swapped], 'left')
+            hi = np.searchsorted(sorted_fwd, rev[swapped], 'right')
+            report.counts['swap'] = report.counts.get('swap', 0) + int((hi - lo).sum()) // 2  # Seen from both sides
+            for i, start, end in zip(swapped.tolist(), lo.tolist(), hi.tolist()):
+                if len(report.details) >= report.max_details:
+                    break
+                t, rest = divmod(int(fwd[i]), num_cells * num_cells)
+                c0, c1 = divmod(rest, num_cells)
+                a = int(step_agents[i])
+                for b in step_agents[order[start:end]].tolist():
+                    if a < b and len(report.details) < report.max_details:
+                        report.details.append(dict(type='swap', agents=[a, b], timestep=t,
+                                                   cells=[list(divmod(c0, ncols)), list(divmod(c1, ncols))]))
+
+
+def _check_conflicts(report: ValidationReport, paths: list, agent_ids: list, grid: np.ndarray):
+    """Find conflicts between non-empty state arrays and fill in the report summary"""
+    nrows, ncols = grid.shape
+    lengths = np.array([len(p) for p in paths], dtype=np.int64)
+    makespan = int(lengths.max()) if len(paths) else 0
+    if len(paths) > 1:
+        # Pad every agent at its last cell; off-map states were reported above and are clipped onto the map
+        positions = np.empty((len(paths), makespan, 2), dtype=np.int64)
+        for i, states in enumerate(paths):
+            positions[i, :len(states)] = states[:, :2]
+            positions[i, len(states):] = states[-1, :2]
+        np.clip(positions, 0, [nrows - 1, ncols - 1], out=positions)
+        cells = positions[:, :, 0] * ncols + positions[:, :, 1]
+        find_conflicts(report, cells, np.array(agent_ids, dtype=np.int64), ncols, nrows * ncols)
+    report.summary = dict(num_agents=len(paths), makespan=makespan, sum_of_costs=int((lengths - 1).sum()))
+
+
+def check_paths(grid: np.ndarray, paths, starts=None, goals=None, max_details: int = 20) -> ValidationReport:
+    """Validate paths held in memory against ``grid``.
+
+    ``paths`` is a list of paths, or a dict from agent id to path, of
+    (row, col[, orientation]) states. Conflicts between agents are always
+    checked; the single-agent rules are checked as well when ``starts``
+    and ``goals`` (indexed like ``paths``) are given.
+    """
+    report = ValidationReport(max_details)
+    agent_ids = []
+    arrays = []
+    for agent_id, path in (sorted(paths.items()) if isinstance(paths, dict) else enumerate(paths)):
+        if len(path) == 0:
+            report.add('empty_path', agent=agent_id)
+            continue
+        states = np.asarray(path, dtype=np.int64).reshape(len(path), -1)
+        if starts is not None and goals is not None:
+            check_agent_path(report, agent_id, states, grid, starts[agent_id], goals[agent_id])
+        agent_ids.append(agent_id)
+        arrays.append(states)
+    _check_conflicts(report, arrays, agent_ids, grid)
+    return report
+
+
+def validate_solution(map_file: str, scen_file: str, paths_file: str, agent_num: int = None,
+                      max_details: int = 20) -> ValidationReport:
+    """Validate ``paths_file`` against a map and scenario.
+
+    ``agent_num`` is the number of agents the solution must contain (ids
+    0..agent_num-1); by default every agent in the paths file is checked and
+    none is required to be present.
+    """
+    report = ValidationReport(max_details)
+    grid = mapf_io.load_grid(map_file)
+    scen = mapf_io.load_scen_array(scen_file)
+
+    agent_ids = []
+    paths = []
+    seen = set()
+    for agent_id, states in mapf_io.iter_paths(paths_file):
+        if agent_id in seen:
+            report.add('duplicate_agent', agent=agent_id)
+            continue
+        seen.add(agent_id)
+        if agent_id >= len(scen):
+            report.add('unknown_agent', agent=agent_id, scen_agents=len(scen))
+            continue
+        if len(states) == 0:
+            report.add('empty_path', agent=agent_id)
+            continue
+        check_agent_path(report, agent_id, states, grid, scen[agent_id, :2], scen[agent_id, 2:])
+        agent_ids.append(agent_id)
+        paths.append(states)
+    if agent_num is not None:
+        missing = sorted(set(range(agent_num)) - seen)
+        if missing:
+            report.add('missing_agent', len(missing), agents=missing[:max_details])
+    _check_conflicts(report, paths, agent_ids, grid)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate a MAPF solution against its map and scenario")
+    parser.add_argument('map_file')
+    parser.add_argument('scen_file')
+    parser.add_argument('paths_file')
+    parser.add_argument('--agent-num', type=int, default=None, help="Require agents 0..N-1 to be present")
+    parser.add_argument('--max-details', type=int, default=20, help="Number of violations to describe in full")
+    parser.add_argument('--format', choices=('json', 'text'), default='json')
+    args = parser.parse_args()
+
+    try:
+        report = validate_solution(args.map_file, args.scen_file, args.paths_file, args.agent_num, args.max_details)
+    except (OSError, ValueError) as e:
+        print(json.dumps({'valid': False, 'error': str(e)}) if args.format == 'json' else f"Error: {e}")
+        sys.exit(2)
+    print(json.dumps(report.as_dict(), indent=2) if args.format == 'json' else report.format_text())
+    sys.exit(0 if report.valid else 1)
+
+
+if __name__ == '__main__':
+    main()